@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+''' Times AutocompleteProvider without a display, on projects with many
+    labels and bibliography entries.
+
+    Usage: benchmarks/benchmark_autocomplete.py [--labels 100 1000 10000]
+           [--repeat 3] [--json results.json]
+
+    "startup" is the construction of the provider, including the first
+    parse of the included files, "keystroke" the time to fill the
+    completion window after each typed character, "included files" the
+    time of the periodic check of the included files, when they are
+    unchanged and when they have to be parsed again. '''
+
+import sys
+import os.path
+import re
+import argparse
+import gettext
+import json
+import time
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.dont_write_bytecode = True
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# ServiceLocator imports GtkSource, the provider is set up the way
+# ServiceLocator.init_autocomplete_provider does it instead
+from setzer.app.autocomplete_provider.autocomplete_provider import AutocompleteProvider
+import corpus
+
+
+resources_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'resources')
+latex_parser_regex = re.compile(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[.*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}')
+
+# typed character by character, the completion window opens after two
+words = ['\\section', '\\textbf', '\\begin', '\\includegraphics', '\\mathbb', '\\ref{sec:1', '\\eqref{eq:2', '\\ref{ch:3', '\\pageref{thm:4', '\\cite{key1', '\\citep{key2', '\\usepackage{ams']
+
+
+class FakeDocument(object):
+    ''' The part of the Document API the provider uses. '''
+
+    def __init__(self, filename, labels, included_latex_files=list(), bibliography_files=set()):
+        self.filename = filename
+        self.labels = labels
+        self.included_latex_files = included_latex_files
+        self.bibliography_files = bibliography_files
+
+    def get_filename(self):
+        return self.filename
+
+    def get_dirname(self):
+        return os.path.dirname(self.filename)
+
+    def get_labels(self):
+        return self.labels
+
+    def get_bibitems(self):
+        return set()
+
+    def get_included_latex_files(self):
+        return self.included_latex_files
+
+    def get_bibliography_files(self):
+        return self.bibliography_files
+
+
+class FakeWorkspace(object):
+    ''' The part of the Workspace API the provider uses. '''
+
+    def __init__(self, documents):
+        self.open_documents = documents
+        self.open_latex_documents = documents
+        self.active_document = documents[0]
+
+    def get_open_documents_filenames(self):
+        return [document.get_filename() for document in self.open_documents]
+
+    def get_document_by_filename(self, filename):
+        for document in self.open_documents:
+            if document.get_filename() == filename:
+                return document
+        return None
+
+
+def get_packages_dict():
+    packages_dict = dict()
+    tree = ET.parse(os.path.join(resources_path, 'latexdb', 'packages', 'general.xml'))
+    for child in tree.getroot():
+        attrib = child.attrib
+        packages_dict[attrib['name']] = {'command': attrib['text'], 'description': _(attrib['description'])}
+    return packages_dict
+
+
+def create_project(dirname, number_of_labels):
+    ''' The active document and a second open document, a chapter and a
+        .bib file on disk, with number_of_labels labels or entries each. '''
+
+    with open(os.path.join(dirname, 'chapter.tex'), 'w') as f:
+        f.write('\n'.join('\\section{Chapter ' + str(i) + '}\\label{ch:' + str(i) + '}' for i in range(number_of_labels)) + '\n')
+    with open(os.path.join(dirname, 'references.bib'), 'w') as f:
+        f.write(corpus.generate_bibliography(number_of_labels))
+
+    labels = set()
+    for i in range(number_of_labels):
+        labels.add(['sec:', 'eq:', 'thm:'][i % 3] + str(i))
+    main_document = FakeDocument(os.path.join(dirname, 'main.tex'), labels, [('chapter.tex', 0)], {'references.bib'})
+    other_document = FakeDocument(os.path.join(dirname, 'other.tex'), {'other:' + str(i) for i in range(number_of_labels)})
+    return FakeWorkspace([main_document, other_document])
+
+
+def get_percentiles(values):
+    values = sorted(values)
+    if len(values) == 0: return dict()
+
+    result = dict()
+    for name, fraction in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1)]:
+        result[name] = values[int(round(fraction * (len(values) - 1)))] * 1000
+    return result
+
+
+def time_function(function, repeat):
+    times = list()
+    for i in range(repeat):
+        time_start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - time_start)
+    return min(times)
+
+
+def type_words(provider, repeat):
+    keystroke_times = list()
+    for i in range(repeat):
+        for word in words:
+            for length in range(2, len(word) + 1):
+                time_start = time.perf_counter()
+                provider.get_items_for_completion_window(word[:length])
+                keystroke_times.append(time.perf_counter() - time_start)
+    return keystroke_times
+
+
+def touch_included_files(dirname):
+    ''' Files are parsed again if they changed after the last parse. '''
+
+    mtime = time.time() + 1
+    for filename in ['chapter.tex', 'references.bib']:
+        os.utime(os.path.join(dirname, filename), (mtime, mtime))
+
+
+def run_benchmark(number_of_labels, repeat):
+    ''' Timing and memory are measured in separate runs, because
+        tracemalloc slows everything down. '''
+
+    packages_dict = get_packages_dict()
+
+    with tempfile.TemporaryDirectory() as dirname:
+        workspace = create_project(dirname, number_of_labels)
+
+        time_start = time.perf_counter()
+        provider = AutocompleteProvider(resources_path, workspace, latex_parser_regex, packages_dict)
+        startup_time = time.perf_counter() - time_start
+
+        keystroke_times = type_words(provider, repeat)
+        unchanged_time = time_function(provider.parse_included_files, repeat)
+        changed_time = time_function(lambda: (touch_included_files(dirname), provider.parse_included_files()), repeat)
+
+        tracemalloc.start()
+        provider = AutocompleteProvider(resources_path, workspace, latex_parser_regex, packages_dict)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = dict()
+    result['name'] = str(number_of_labels) + ' labels'
+    result['labels'] = number_of_labels
+    result['keystrokes'] = len(keystroke_times)
+    result['startup_ms'] = startup_time * 1000
+    result['keystroke_ms'] = get_percentiles(keystroke_times)
+    result['included_files_unchanged_ms'] = unchanged_time * 1000
+    result['included_files_changed_ms'] = changed_time * 1000
+    result['peak_memory_mb'] = peak_memory / 1048576
+    return result
+
+
+def print_result(result):
+    print(result['name'] + ': ' + str(result['keystrokes']) + ' keystrokes')
+    print('    startup:   {:.1f} ms'.format(result['startup_ms']))
+    print('    keystroke: ' + ' / '.join('{:.3f}'.format(result['keystroke_ms'].get(key, 0)) for key in ['p50', 'p95', 'p99', 'max']) + ' ms (p50 / p95 / p99 / max)')
+    print('    included files: {:.2f} ms unchanged, {:.1f} ms changed'.format(result['included_files_unchanged_ms'], result['included_files_changed_ms']))
+    print('    peak memory: {:.1f} MB after startup'.format(result['peak_memory_mb']))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Time the autocomplete provider on projects with many labels.')
+    argument_parser.add_argument('--labels', type=int, nargs='*', default=[100, 1000, 10000], help='labels per document and entries in the .bib file')
+    argument_parser.add_argument('--repeat', type=int, default=3, help='runs per measurement')
+    argument_parser.add_argument('--json', help='write the results to this file')
+    arguments = argument_parser.parse_args()
+
+    gettext.install('setzer', names=('ngettext',))
+
+    results = list()
+    for number_of_labels in arguments.labels:
+        result = run_benchmark(number_of_labels, arguments.repeat)
+        print_result(result)
+        results.append(result)
+
+    if arguments.json != None:
+        with open(arguments.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
+
+
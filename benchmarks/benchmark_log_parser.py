@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+''' Times LaTeXLogParser on large build logs without a display.
+
+    Usage: benchmarks/benchmark_log_parser.py [--size 1 10]
+           [--file real_world.log ...] [--repeat 5] [--json results.json]
+
+    "split" is the time of split_log_text_by_file, "parse" the time of
+    parse_build_log including reading the file. '''
+
+import sys
+import os.path
+import argparse
+import json
+import time
+import tempfile
+import tracemalloc
+
+sys.dont_write_bytecode = True
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from setzer.document.build_system.latex_log_parser.latex_log_parser import LaTeXLogParser
+import corpus
+
+
+def time_function(function, repeat):
+    times = list()
+    for i in range(repeat):
+        time_start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - time_start)
+    return (min(times), result)
+
+
+def run_benchmark(name, log_text, repeat):
+    log_parser = LaTeXLogParser()
+
+    with tempfile.TemporaryDirectory() as dirname:
+        tex_filename = os.path.join(dirname, 'main.tex')
+        with open(os.path.join(dirname, 'main.log'), 'w') as f:
+            f.write(log_text)
+
+        split_time, doc_texts = time_function(lambda: log_parser.split_log_text_by_file(log_text, tex_filename), repeat)
+        parse_time, log_items = time_function(lambda: log_parser.parse_build_log(tex_filename), repeat)
+
+        tracemalloc.start()
+        log_parser.parse_build_log(tex_filename)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = dict()
+    result['name'] = name
+    result['size_mb'] = len(log_text.encode('utf-8')) / 1048576
+    result['files'] = len(doc_texts)
+    result['items'] = sum(len(items[item_type]) for items in log_items.values() for item_type in ['error', 'warning', 'badbox'])
+    result['split_ms'] = split_time * 1000
+    result['parse_ms'] = parse_time * 1000
+    result['peak_memory_mb'] = peak_memory / 1048576
+    return result
+
+
+def print_result(result):
+    print(result['name'] + ': {:.1f} MB, '.format(result['size_mb']) + str(result['files']) + ' files, ' + str(result['items']) + ' items')
+    print('    split: {:.1f} ms'.format(result['split_ms']))
+    print('    parse: {:.1f} ms'.format(result['parse_ms']))
+    print('    peak memory: {:.1f} MB'.format(result['peak_memory_mb']))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Time the LaTeX log parser on large build logs.')
+    argument_parser.add_argument('--size', type=float, nargs='*', default=[1, 10], help='sizes of the synthetic logs in MB')
+    argument_parser.add_argument('--file', action='append', default=[], help='real world .log file to benchmark, can be given more than once')
+    argument_parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the fastest one is reported')
+    argument_parser.add_argument('--json', help='write the results to this file')
+    arguments = argument_parser.parse_args()
+
+    logs = list()
+    for size in arguments.size:
+        logs.append(('synthetic {:g} MB'.format(size), corpus.generate_log(int(size * 1048576))))
+    for filename in arguments.file:
+        with open(filename, 'rb') as f:
+            logs.append((os.path.basename(filename), f.read().decode('utf-8', errors='ignore')))
+
+    results = list()
+    for name, log_text in logs:
+        result = run_benchmark(name, log_text, arguments.repeat)
+        print_result(result)
+        results.append(result)
+
+    if arguments.json != None:
+        with open(arguments.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
+
+
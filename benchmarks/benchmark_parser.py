@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+''' Replays keystroke traces against ParserLaTeX without a display and
+    reports per edit latencies and peak memory.
+
+    Usage: benchmarks/benchmark_parser.py [--lines 1000 10000 100000]
+           [--file real_world.tex ...] [--trace trace.json] [--edits 2000]
+           [--save-trace trace.json] [--json results.json]
+
+    "edit" is the time spent in the buffer signal handlers, "parse" the
+    time of the idle parse pass that follows each edit. '''
+
+import sys
+import os.path
+import argparse
+import json
+import time
+import tracemalloc
+
+sys.dont_write_bytecode = True
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gi
+from gi.repository import GLib
+
+from setzer.document.parser.parser_latex import ParserLaTeX
+import fake_buffer
+import corpus
+import traces
+
+
+class FakeDocument(object):
+    ''' The part of the Document API the parser uses. '''
+
+    def __init__(self):
+        self.symbols = dict()
+        for key in ['labels', 'todos', 'bibliographies', 'bibitems', 'packages']:
+            self.symbols[key] = set()
+        for key in ['labels_with_offset', 'todos_with_offset', 'included_latex_files', 'blocks']:
+            self.symbols[key] = list()
+        self.symbols['packages_detailed'] = dict()
+
+    def set_blocks(self, blocks):
+        self.symbols['blocks'] = blocks
+
+    def get_blocks(self):
+        return self.symbols['blocks']
+
+    def add_change_code(self, change_code, parameter=None):
+        pass
+
+
+def load_document(text):
+    document = FakeDocument()
+    parser = ParserLaTeX(document)
+    buffer = fake_buffer.FakeBuffer()
+    buffer.connect_parser(parser)
+
+    time_start = time.perf_counter()
+    buffer.insert(buffer.get_start_iter(), text)
+    context = GLib.MainContext.default()
+    while parser.background_parse_running:
+        context.iteration(True)
+    parser.flush()
+    load_time = time.perf_counter() - time_start
+
+    return (parser, buffer, load_time)
+
+
+def get_edit_iters(buffer, edit):
+    line = edit[1] % buffer.get_line_count()
+    start_iter = buffer.get_iter_at_line_offset(line, edit[2])
+    if edit[0] == 'insert':
+        return (start_iter, None)
+    return (start_iter, buffer.get_iter_at_offset(start_iter.get_offset() + edit[3]))
+
+
+def replay_trace(parser, buffer, trace):
+    edit_times = list()
+    parse_times = list()
+    for edit in trace:
+        start_iter, end_iter = get_edit_iters(buffer, edit)
+        if edit[0] == 'insert':
+            time_start = time.perf_counter()
+            parser.on_text_inserted(buffer, start_iter, edit[3], len(edit[3].encode('utf-8')))
+            edit_times.append(time.perf_counter() - time_start)
+            buffer.apply_insert(start_iter.get_offset(), edit[3])
+        else:
+            if start_iter.get_offset() == end_iter.get_offset(): continue
+            time_start = time.perf_counter()
+            parser.on_text_deleted(buffer, start_iter, end_iter)
+            edit_times.append(time.perf_counter() - time_start)
+            buffer.apply_delete(start_iter.get_offset(), end_iter.get_offset())
+
+        time_start = time.perf_counter()
+        parser.flush()
+        parse_times.append(time.perf_counter() - time_start)
+    return (edit_times, parse_times)
+
+
+def get_percentiles(values):
+    values = sorted(values)
+    if len(values) == 0: return dict()
+
+    result = dict()
+    for name, fraction in [('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1)]:
+        result[name] = values[int(round(fraction * (len(values) - 1)))] * 1000
+    return result
+
+
+def run_benchmark(name, text, trace):
+    ''' Timing and memory are measured in separate runs, because
+        tracemalloc slows everything down. '''
+
+    parser, buffer, load_time = load_document(text)
+    edit_times, parse_times = replay_trace(parser, buffer, trace)
+
+    tracemalloc.start()
+    parser, buffer, load_time_traced = load_document(text)
+    peak_load = tracemalloc.get_traced_memory()[1]
+    replay_trace(parser, buffer, trace)
+    peak_total = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = dict()
+    result['name'] = name
+    result['lines'] = text.count('\n') + 1
+    result['edits'] = len(edit_times)
+    result['load_ms'] = load_time * 1000
+    result['edit_ms'] = get_percentiles(edit_times)
+    result['parse_ms'] = get_percentiles(parse_times)
+    result['peak_memory_load_mb'] = peak_load / 1048576
+    result['peak_memory_mb'] = peak_total / 1048576
+    return result
+
+
+def print_result(result):
+    def format_percentiles(values):
+        return ' / '.join('{:.3f}'.format(values.get(key, 0)) for key in ['p50', 'p95', 'p99', 'max'])
+
+    print(result['name'] + ': ' + str(result['lines']) + ' lines, ' + str(result['edits']) + ' edits')
+    print('    load:  {:.1f} ms'.format(result['load_ms']))
+    print('    edit:  ' + format_percentiles(result['edit_ms']) + ' ms (p50 / p95 / p99 / max)')
+    print('    parse: ' + format_percentiles(result['parse_ms']) + ' ms (p50 / p95 / p99 / max)')
+    print('    peak memory: {:.1f} MB after load, {:.1f} MB after replay'.format(result['peak_memory_load_mb'], result['peak_memory_mb']))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Replay keystroke traces against the LaTeX parser.')
+    argument_parser.add_argument('--lines', type=int, nargs='*', default=[1000, 10000, 100000], help='sizes of the synthetic documents')
+    argument_parser.add_argument('--file', action='append', default=[], help='real world .tex file to benchmark, can be given more than once')
+    argument_parser.add_argument('--trace', help='recorded trace to replay instead of a generated one')
+    argument_parser.add_argument('--edits', type=int, default=2000, help='length of generated traces')
+    argument_parser.add_argument('--save-trace', help='write the generated trace for the first document to this file')
+    argument_parser.add_argument('--json', help='write the results to this file')
+    arguments = argument_parser.parse_args()
+
+    documents = list()
+    for number_of_lines in arguments.lines:
+        documents.append(('synthetic ' + str(number_of_lines), corpus.generate_document(number_of_lines)))
+    for filename in arguments.file:
+        with open(filename, 'r') as f:
+            documents.append((os.path.basename(filename), f.read()))
+
+    results = list()
+    for name, text in documents:
+        if arguments.trace != None:
+            trace = traces.load_trace(arguments.trace)
+        else:
+            trace = traces.generate_trace(text.count('\n') + 1, arguments.edits)
+            if arguments.save_trace != None and len(results) == 0:
+                traces.save_trace(trace, arguments.save_trace)
+
+        result = run_benchmark(name, text, trace)
+        print_result(result)
+        results.append(result)
+
+    if arguments.json != None:
+        with open(arguments.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
+
+
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import random
+
+
+words = ['the', 'of', 'a', 'theorem', 'space', 'we', 'show', 'that', 'every', 'bounded', 'operator', 'is', 'compact', 'if', 'and', 'only', 'for', 'all', 'sequences', 'in', 'this', 'section', 'proof', 'follows', 'from', 'lemma', 'above', 'with', 'respect', 'to', 'norm']
+packages = ['amsmath', 'amssymb', 'amsthm', 'graphicx', 'hyperref', 'tikz', 'booktabs', 'geometry', 'xcolor', 'enumitem']
+
+
+def generate_document(number_of_lines, seed=0):
+    ''' Synthetic LaTeX document with roughly number_of_lines lines and a
+        realistic mix of sections, environments, labels and plain text. '''
+
+    rnd = random.Random(seed)
+    lines = ['\\documentclass[11pt]{article}']
+    for package in packages:
+        lines.append('\\usepackage{' + package + '}')
+    lines.append('\\addbibresource{references.bib}')
+    lines.append('')
+    lines.append('\\begin{document}')
+
+    counter = 0
+    while len(lines) < number_of_lines - 2:
+        counter += 1
+        choice = rnd.random()
+        if choice < 0.02:
+            lines.append('\\section{Section ' + str(counter) + '}')
+            lines.append('\\label{sec:' + str(counter) + '}')
+        elif choice < 0.06:
+            lines.append('\\subsection{Subsection ' + str(counter) + '}')
+        elif choice < 0.10:
+            lines.append('\\begin{equation}')
+            lines.append('    f(x) = \\sum_{n=0}^\\infty a_n x^n')
+            lines.append('    \\label{eq:' + str(counter) + '}')
+            lines.append('\\end{equation}')
+        elif choice < 0.13:
+            lines.append('\\begin{itemize}')
+            for i in range(rnd.randint(2, 5)):
+                lines.append('    \\item ' + sentence(rnd))
+            lines.append('\\end{itemize}')
+        elif choice < 0.15:
+            lines.append('\\begin{theorem}\\label{thm:' + str(counter) + '}')
+            lines.append(sentence(rnd))
+            lines.append('\\end{theorem}')
+        elif choice < 0.16:
+            lines.append('\\todo{check ' + str(counter) + '}')
+        elif choice < 0.25:
+            lines.append('')
+        else:
+            lines.append(sentence(rnd) + ' See \\ref{sec:' + str(rnd.randint(1, counter)) + '}.')
+
+    lines.append('\\end{document}')
+    return '\n'.join(lines) + '\n'
+
+
+def sentence(rnd):
+    return ' '.join(rnd.choice(words) for i in range(rnd.randint(6, 16))).capitalize() + '.'
+
+
+def generate_bibliography(number_of_entries, seed=0):
+    ''' Synthetic .bib file with number_of_entries articles and books. '''
+
+    rnd = random.Random(seed)
+    entries = list()
+    for i in range(number_of_entries):
+        entry_type = rnd.choice(['article', 'book'])
+        entry = '@' + entry_type + '{key' + str(i) + ',\n'
+        entry += '    author = {Author ' + str(rnd.randint(1, 500)) + ' and Author ' + str(rnd.randint(1, 500)) + '},\n'
+        entry += '    title = {' + sentence(rnd)[:-1] + '},\n'
+        if entry_type == 'article':
+            entry += '    journal = {Journal ' + str(rnd.randint(1, 50)) + '},\n'
+        else:
+            entry += '    publisher = {Publisher ' + str(rnd.randint(1, 50)) + '},\n'
+        entry += '    year = {' + str(rnd.randint(1950, 2023)) + '}\n}\n'
+        entries.append(entry)
+    return '\n'.join(entries)
+
+
+def generate_log(size, seed=0):
+    ''' Synthetic build log of roughly size bytes for main.tex, with
+        classes and packages, nested chapter files, page numbers, package
+        chatter and a mix of errors, warnings and bad boxes. '''
+
+    rnd = random.Random(seed)
+    parts = ['This is pdfTeX, Version 3.141592653-2.6-1.40.24 (TeX Live 2022)  1 JAN 2023 12:00\nentering extended mode\n**./main.tex\n(./main.tex\nLaTeX2e <2022-11-01> patch level 1\n']
+    parts.append('(/usr/share/texlive/texmf-dist/tex/latex/base/article.cls\nDocument Class: article 2022/07/02 v1.4n Standard LaTeX document class\n(/usr/share/texlive/texmf-dist/tex/latex/base/size11.clo\nFile: size11.clo 2022/07/02 v1.4n Standard LaTeX file (size option)\n))\n')
+    for package in packages:
+        parts.append('(/usr/share/texlive/texmf-dist/tex/latex/' + package + '/' + package + '.sty\nPackage: ' + package + ' 2022/01/01 v1.0 (some author)\n)\n')
+    parts.append('(./main.aux) [1\n\n{/var/lib/texmf/fonts/map/pdftex/updmap/pdftex.map}]\n')
+
+    length = sum(len(part) for part in parts)
+    chapter = 0
+    page = 1
+    while length < size:
+        chapter += 1
+        chapter_parts = ['(./chapters/chapter' + str(chapter) + '.tex\nChapter ' + str(chapter) + '.\n']
+        depth = 1
+        for i in range(rnd.randint(20, 60)):
+            line_number = rnd.randint(1, 2000)
+            choice = rnd.random()
+            if choice < 0.4:
+                chapter_parts.append('Package pgfplots info: (compat) drawing axis ' + str(i) + ' with ' + str(rnd.randint(10, 500)) + ' points (sampled) on input line ' + str(line_number) + '.\n')
+            elif choice < 0.55:
+                chapter_parts.append('\nOverfull \\hbox (' + str(rnd.randint(1, 30)) + '.0pt too wide) in paragraph at lines ' + str(line_number) + '--' + str(line_number + 2) + '\n[]\\OT1/cmr/m/n/10 ' + sentence(rnd) + ' \n []\n\n')
+            elif choice < 0.65:
+                chapter_parts.append('\nUnderfull \\hbox (badness 10000) in paragraph at lines ' + str(line_number) + '--' + str(line_number + 1) + '\n\n []\n\n')
+            elif choice < 0.75:
+                chapter_parts.append('\nLaTeX Warning: Reference `sec:' + str(i) + '\' on page ' + str(page) + ' undefined on input line ' + str(line_number) + '.\n\n')
+            elif choice < 0.78:
+                chapter_parts.append('! Undefined control sequence.\nl.' + str(line_number) + ' \\foo\n     \nThe control sequence at the end of the top line\nof your error message was never \\def\'ed.\n\n')
+            elif choice < 0.85:
+                page += 1
+                chapter_parts.append('[' + str(page) + ']\n')
+            elif choice < 0.9 and depth < 3:
+                depth += 1
+                chapter_parts.append('(./chapters/section' + str(chapter) + '-' + str(i) + '.tex\n')
+            elif depth > 1:
+                depth -= 1
+                chapter_parts.append(')\n')
+            else:
+                chapter_parts.append(sentence(rnd) + '\n')
+        chapter_parts.append(')' * depth + '\n')
+        parts += chapter_parts
+        length += sum(len(part) for part in chapter_parts)
+
+    parts.append('(./main.aux) )\nOutput written on main.pdf (' + str(page) + ' pages, 123456 bytes).\n')
+    return ''.join(parts)
+
+
+
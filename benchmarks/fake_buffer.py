@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import bisect
+
+
+class FakeIter(object):
+    ''' The part of the Gtk.TextIter API the parsers use. '''
+
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+
+    def get_offset(self):
+        return self.offset
+
+    def get_line(self):
+        return bisect.bisect_right(self.buffer.line_starts, self.offset) - 1
+
+    def get_line_offset(self):
+        return self.offset - self.buffer.line_starts[self.get_line()]
+
+    def backward_char(self):
+        self.offset = max(self.offset - 1, 0)
+
+    def forward_chars(self, count):
+        self.offset = min(self.offset + count, len(self.buffer.text))
+
+    def copy(self):
+        return FakeIter(self.buffer, self.offset)
+
+
+class FakeBuffer(object):
+    ''' Stands in for a GtkSource.Buffer, so parsers can be driven
+        without a display. Like Gtk, the parser callbacks run before
+        the text is changed. '''
+
+    def __init__(self):
+        self.text = ''
+        self.line_starts = [0]
+        self.insert_callbacks = list()
+        self.delete_callbacks = list()
+
+    def connect_parser(self, parser):
+        self.insert_callbacks.append(parser.on_text_inserted)
+        self.delete_callbacks.append(parser.on_text_deleted)
+
+    def get_char_count(self):
+        return len(self.text)
+
+    def get_line_count(self):
+        return len(self.line_starts)
+
+    def get_iter_at_offset(self, offset):
+        return FakeIter(self, max(0, min(offset, len(self.text))))
+
+    def get_iter_at_line(self, line):
+        if line < 0: return FakeIter(self, 0)
+        if line >= len(self.line_starts): return FakeIter(self, len(self.text))
+        return FakeIter(self, self.line_starts[line])
+
+    def get_iter_at_line_offset(self, line, line_offset):
+        line = max(0, min(line, len(self.line_starts) - 1))
+        if line + 1 < len(self.line_starts):
+            line_end = self.line_starts[line + 1] - 1
+        else:
+            line_end = len(self.text)
+        return FakeIter(self, min(self.line_starts[line] + line_offset, line_end))
+
+    def get_start_iter(self):
+        return FakeIter(self, 0)
+
+    def get_end_iter(self):
+        return FakeIter(self, len(self.text))
+
+    def get_text(self, start_iter, end_iter, include_hidden_chars):
+        return self.text[start_iter.offset:end_iter.offset]
+
+    def insert(self, location_iter, text):
+        for callback in self.insert_callbacks:
+            callback(self, location_iter, text, len(text.encode('utf-8')))
+        self.apply_insert(location_iter.offset, text)
+
+    def delete(self, start_iter, end_iter):
+        for callback in self.delete_callbacks:
+            callback(self, start_iter, end_iter)
+        self.apply_delete(start_iter.offset, end_iter.offset)
+
+    def apply_insert(self, offset, text):
+        self.text = self.text[:offset] + text + self.text[offset:]
+
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        new_starts = list()
+        position = text.find('\n')
+        while position != -1:
+            new_starts.append(offset + position + 1)
+            position = text.find('\n', position + 1)
+        length = len(text)
+        following = [start + length for start in self.line_starts[line + 1:]]
+        self.line_starts[line + 1:] = new_starts + following
+
+    def apply_delete(self, offset_start, offset_end):
+        self.text = self.text[:offset_start] + self.text[offset_end:]
+
+        line_start = bisect.bisect_right(self.line_starts, offset_start) - 1
+        line_end = bisect.bisect_right(self.line_starts, offset_end) - 1
+        length = offset_end - offset_start
+        following = [start - length for start in self.line_starts[line_end + 1:]]
+        self.line_starts[line_start + 1:] = following
+
+
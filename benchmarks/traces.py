@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import json
+import random
+
+
+def load_trace(filename):
+    ''' A trace is a list of edits, either ['insert', line, column, text]
+        or ['delete', line, column, length]. Lines wrap around and columns
+        are clamped on replay, so one trace fits documents of any size. '''
+
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def save_trace(trace, filename):
+    with open(filename, 'w') as f:
+        json.dump(trace, f, indent=0)
+
+
+def generate_trace(number_of_lines, number_of_edits=2000, seed=0):
+    ''' Simulated editing session: typing character by character, including
+        half typed commands, backspacing, new lines, pastes and cut lines. '''
+
+    rnd = random.Random(seed)
+    trace = list()
+    line = rnd.randrange(number_of_lines)
+    column = 0
+
+    while len(trace) < number_of_edits:
+        choice = rnd.random()
+        if choice < 0.1:
+            line = rnd.randrange(number_of_lines)
+            column = 0
+        elif choice < 0.45:
+            for char in 'We prove the claim by induction. ':
+                trace.append(['insert', line, column, char])
+                column += 1
+        elif choice < 0.6:
+            for i in range(rnd.randint(1, 8)):
+                if column == 0: break
+                column -= 1
+                trace.append(['delete', line, column, 1])
+        elif choice < 0.7:
+            trace.append(['insert', line, column, '\n'])
+            line += 1
+            column = 0
+        elif choice < 0.8:
+            for text in ['\\section{Results}', '\n', '\\label{sec:results}', '\n']:
+                for char in text:
+                    trace.append(['insert', line, column, char])
+                    column += 1
+                    if char == '\n':
+                        line += 1
+                        column = 0
+        elif choice < 0.88:
+            for char in '\\begin{itemize}\n\\item \n\\end{itemize}\n':
+                trace.append(['insert', line, column, char])
+                column += 1
+                if char == '\n':
+                    line += 1
+                    column = 0
+        elif choice < 0.94:
+            trace.append(['insert', line, 0, '\\begin{equation}\n    a^2 + b^2 = c^2\n    \\label{eq:pythagoras}\n\\end{equation}\n'])
+            line += 4
+            column = 0
+        else:
+            trace.append(['delete', line, 0, 200])
+            column = 0
+
+    return trace[:number_of_edits]
+
+
@@ -110,7 +110,7 @@ class AutocompleteProvider(object):
                     items.append(item)
         return items
 
-    #@timer.timer
+    @timer.timer
     def get_items(self, word):
         items = list()
         try: static_items = self.static_proposals[word.lower()]
@@ -185,7 +185,7 @@ class AutocompleteProvider(object):
                     dynamic_items.append(command)
         return dynamic_items
 
-    #@timer.timer
+    @timer.timer
     def get_bibitems_for_dynamic_items(self):
         bibitems_first = set()
         bibitems_second = set()
@@ -371,7 +371,7 @@ class AutocompleteProvider(object):
                 except KeyError:
                     self.static_begin_end_proposals[command['command'][0:i].lower()] = [command]
 
-    #@timer.timer
+    @timer.timer
     def generate_static_proposals(self):
         commands = self.get_commands()
         self.static_proposals = dict()
@@ -392,7 +392,7 @@ class AutocompleteProvider(object):
                     except KeyError:
                         self.static_proposals[command['command'][0:i].lower()] = [command]
 
-    #@timer.timer
+    @timer.timer
     def get_commands(self):
         commands = dict()
         for filename in ['additional.xml', 'latex-document.xml', 'tex.xml', 'textcomp.xml', 'graphicx.xml', 'latex-dev.xml', 'amsmath.xml', 'amsopn.xml', 'amsbsy.xml', 'amsfonts.xml', 'amssymb.xml', 'amsthm.xml', 'color.xml', 'url.xml', 'geometry.xml', 'glossaries.xml', 'beamer.xml', 'hyperref.xml']:
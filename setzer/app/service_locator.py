@@ -147,6 +147,9 @@ class ServiceLocator(object):
     def get_config_folder():
         return os.path.join(GLib.get_user_config_dir(), 'setzer')
 
+    def get_cache_folder():
+        return os.path.join(GLib.get_user_cache_dir(), 'setzer')
+
     def set_setzer_version(setzer_version):
         ServiceLocator.setzer_version = setzer_version
 
@@ -76,6 +76,13 @@ class Settings(Observable):
         self.defaults['preferences']['autoshow_build_log'] = 'errors_warnings'
         self.defaults['preferences']['latex_interpreter'] = 'xelatex'
         self.defaults['preferences']['use_latexmk'] = False
+        self.defaults['preferences']['max_parallel_builds'] = 2
+        self.defaults['preferences']['build_from_snapshot'] = False
+        self.defaults['preferences']['use_preamble_format'] = False
+        self.defaults['preferences']['build_on_change'] = False
+        self.defaults['preferences']['build_on_change_delay'] = 1000
+        self.defaults['preferences']['preview_memory_budget'] = 128
+        self.defaults['preferences']['preview_keep_low_resolution_copies'] = True
         self.defaults['preferences']['color_scheme'] = 'default'
         self.defaults['preferences']['invert_pdf'] = False
         self.defaults['preferences']['spaces_instead_of_tabs'] = True
@@ -24,6 +24,7 @@ import setzer.dialogs.close_confirmation.close_confirmation as close_confirmatio
 import setzer.dialogs.document_wizard.document_wizard as document_wizard
 import setzer.dialogs.document_changed_on_disk.document_changed_on_disk as document_changed_on_disk_dialog
 import setzer.dialogs.document_deleted_on_disk.document_deleted_on_disk as document_deleted_on_disk_dialog
+import setzer.dialogs.export_build_timings.export_build_timings as export_build_timings_dialog
 import setzer.dialogs.include_bibtex_file.include_bibtex_file as include_bibtex_file_dialog
 import setzer.dialogs.include_latex_file.include_latex_file as include_latex_file_dialog
 import setzer.dialogs.interpreter_missing.interpreter_missing as interpreter_missing_dialog
@@ -52,6 +53,7 @@ class DialogLocator(object):
         dialogs['document_wizard'] = document_wizard.DocumentWizard(main_window, workspace)
         dialogs['document_changed_on_disk'] = document_changed_on_disk_dialog.DocumentChangedOnDiskDialog(main_window)
         dialogs['document_deleted_on_disk'] = document_deleted_on_disk_dialog.DocumentDeletedOnDiskDialog(main_window)
+        dialogs['export_build_timings'] = export_build_timings_dialog.ExportBuildTimingsDialog(main_window)
         dialogs['include_bibtex_file'] = include_bibtex_file_dialog.IncludeBibTeXFile(main_window)
         dialogs['include_latex_file'] = include_latex_file_dialog.IncludeLaTeXFile(main_window)
         dialogs['interpreter_missing'] = interpreter_missing_dialog.InterpreterMissingDialog(main_window)
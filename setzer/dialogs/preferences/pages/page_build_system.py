@@ -19,10 +19,13 @@ import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('Xdp', '1.0')
 from gi.repository import Gtk, Xdp
+from gi.repository import GLib
 
 import os
 import subprocess
 
+from setzer.app.service_locator import ServiceLocator
+
 
 class PageBuildSystem(object):
 
@@ -37,6 +40,29 @@ class PageBuildSystem(object):
         self.view.option_cleanup_build_files.set_active(self.settings.get_value('preferences', 'cleanup_build_files'))
         self.view.option_cleanup_build_files.connect('toggled', self.preferences.on_check_button_toggle, 'cleanup_build_files')
 
+        self.view.option_build_from_snapshot.set_active(self.settings.get_value('preferences', 'build_from_snapshot'))
+        self.view.option_build_from_snapshot.connect('toggled', self.preferences.on_check_button_toggle, 'build_from_snapshot')
+
+        self.view.option_use_preamble_format.set_active(self.settings.get_value('preferences', 'use_preamble_format'))
+        self.view.option_use_preamble_format.connect('toggled', self.preferences.on_check_button_toggle, 'use_preamble_format')
+
+        self.view.option_build_on_change.set_active(self.settings.get_value('preferences', 'build_on_change'))
+        self.view.option_build_on_change.connect('toggled', self.preferences.on_check_button_toggle, 'build_on_change')
+        self.view.build_on_change_delay_spinbutton.set_value(self.settings.get_value('preferences', 'build_on_change_delay'))
+        self.view.build_on_change_delay_spinbutton.connect('value-changed', self.preferences.spin_button_changed, 'build_on_change_delay')
+
+        self.view.max_parallel_builds_spinbutton.set_value(self.settings.get_value('preferences', 'max_parallel_builds'))
+        self.view.max_parallel_builds_spinbutton.connect('value-changed', self.preferences.spin_button_changed, 'max_parallel_builds')
+
+        self.view.preview_memory_budget_spinbutton.set_value(self.settings.get_value('preferences', 'preview_memory_budget'))
+        self.view.preview_memory_budget_spinbutton.connect('value-changed', self.preferences.spin_button_changed, 'preview_memory_budget')
+        self.view.option_preview_keep_low_resolution_copies.set_active(self.settings.get_value('preferences', 'preview_keep_low_resolution_copies'))
+        self.view.option_preview_keep_low_resolution_copies.connect('toggled', self.preferences.on_check_button_toggle, 'preview_keep_low_resolution_copies')
+        self.preview_memory_used_timeout = None
+        self.view.preview_memory_used_label.connect('map', self.on_preview_memory_used_label_map)
+        if self.view.preview_memory_used_label.get_mapped():
+            self.on_preview_memory_used_label_map(self.view.preview_memory_used_label)
+
         self.view.option_autoshow_build_log_errors.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors')
         self.view.option_autoshow_build_log_errors_warnings.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors_warnings')
         self.view.option_autoshow_build_log_all.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'all')
@@ -106,6 +132,22 @@ class PageBuildSystem(object):
             self.view.shell_escape_revealer.set_reveal_child(not self.view.option_latex_interpreter['tectonic'].get_active())
             self.view.tectonic_warning_revealer.set_reveal_child(self.view.option_latex_interpreter['tectonic'].get_active())
 
+    def on_preview_memory_used_label_map(self, label):
+        ''' Refreshed while the label is shown, pages keep rendering. '''
+
+        self.update_preview_memory_used()
+        if self.preview_memory_used_timeout == None:
+            self.preview_memory_used_timeout = GLib.timeout_add(1000, self.update_preview_memory_used)
+
+    def update_preview_memory_used(self):
+        if not self.view.preview_memory_used_label.get_mapped():
+            self.preview_memory_used_timeout = None
+            return False
+
+        memory_used = ServiceLocator.get_workspace().preview_surface_cache.get_memory_used()
+        self.view.preview_memory_used_label.set_text(_('{amount} MB in use').format(amount='{:.1f}'.format(memory_used / 1048576)))
+        return True
+
     def on_use_tectonic_toggled(self, button):
         self.view.latexmk_enable_revealer.set_reveal_child(not button.get_active())
         self.view.shell_escape_revealer.set_reveal_child(not button.get_active())
@@ -184,6 +226,46 @@ class PageBuildSystemView(Gtk.VBox):
         self.latexmk_enable_revealer.add(self.option_use_latexmk)
         self.pack_start(self.latexmk_enable_revealer, False, False, 0)
 
+        self.option_build_from_snapshot = Gtk.CheckButton(_('Build from the text in the editor, without saving first.'))
+        self.pack_start(self.option_build_from_snapshot, False, False, 0)
+
+        self.option_use_preamble_format = Gtk.CheckButton(_('Precompile the preamble (pdflatex and xelatex, without latexmk).'))
+        self.pack_start(self.option_use_preamble_format, False, False, 0)
+
+        self.option_build_on_change = Gtk.CheckButton(_('Rebuild automatically when the text changes, after a pause of (ms):'))
+        self.pack_start(self.option_build_on_change, False, False, 0)
+        box = Gtk.HBox()
+        self.build_on_change_delay_spinbutton = Gtk.SpinButton.new_with_range(250, 10000, 250)
+        box.pack_start(self.build_on_change_delay_spinbutton, False, False, 0)
+        self.pack_start(box, False, False, 0)
+
+        label = Gtk.Label()
+        label.set_markup(_('Maximum number of documents built at the same time:'))
+        label.set_xalign(0)
+        label.set_margin_top(6)
+        label.set_margin_bottom(6)
+        self.pack_start(label, False, False, 0)
+        box = Gtk.HBox()
+        self.max_parallel_builds_spinbutton = Gtk.SpinButton.new_with_range(1, 16, 1)
+        box.pack_start(self.max_parallel_builds_spinbutton, False, False, 0)
+        self.pack_start(box, False, False, 0)
+
+        label = Gtk.Label()
+        label.set_markup(_('Memory for rendered pages in the .pdf-Preview, for all documents (MB):'))
+        label.set_xalign(0)
+        label.set_margin_top(6)
+        label.set_margin_bottom(6)
+        self.pack_start(label, False, False, 0)
+        box = Gtk.HBox()
+        self.preview_memory_budget_spinbutton = Gtk.SpinButton.new_with_range(32, 4096, 32)
+        box.pack_start(self.preview_memory_budget_spinbutton, False, False, 0)
+        self.preview_memory_used_label = Gtk.Label()
+        self.preview_memory_used_label.set_margin_start(12)
+        box.pack_start(self.preview_memory_used_label, False, False, 0)
+        self.pack_start(box, False, False, 0)
+        self.option_preview_keep_low_resolution_copies = Gtk.CheckButton(_('Keep low resolution copies of pages that don\'t fit.'))
+        self.pack_start(self.option_preview_keep_low_resolution_copies, False, False, 0)
+
         label = Gtk.Label()
         label.set_markup('<b>' + _('Automatically show build log ..') + ' </b>')
         label.set_xalign(0)
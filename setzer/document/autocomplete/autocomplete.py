@@ -632,7 +632,7 @@ class Autocomplete(object):
     def is_active(self):
         return self.state['is_active']
 
-    #@timer.timer
+    @timer.timer
     def populate(self, offset):
         self.view.empty_list()
         for command in reversed(self.items):
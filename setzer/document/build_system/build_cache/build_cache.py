@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os
+import os.path
+import base64
+import hashlib
+import threading
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuildCache(object):
+    ''' Remembers the result of the last successful build together with a
+        hash of everything that went into it, so repeated builds of an
+        unchanged document can reuse the pdf, log and synctex data. '''
+
+    def __init__(self):
+        self.config_folder = ServiceLocator.get_config_folder()
+        self.input_regex = ServiceLocator.get_regex_object(r'\\(include|input|subfile|subimport|bibliography|addbibresource|usepackage|includegraphics)(?:\[[^\{\[]*\]){0,1}\{([^\{\}]*)\}')
+        self.graphics_extensions = ['', '.pdf', '.png', '.jpg', '.jpeg', '.eps']
+
+        self.key = None
+        self.build_result = None
+        self.pdf_stat = None
+        # keys are computed and results looked up in build pool workers
+        self.lock = threading.RLock()
+
+    def get_key(self, tex_filename, build_data):
+        ''' Hash of the root file, all files it includes (transitively),
+            bibliographies, local .sty files and graphics, together with
+            the interpreter and build options. Reads files, call it from
+            a worker thread. '''
+
+        dirname = os.path.dirname(tex_filename)
+
+        # files known to the parser, the files on disk are scanned as well
+        pending_files = [tex_filename]
+        for filename in build_data.get('included_latex_files', list()):
+            pending_files.append(os.path.join(dirname, filename))
+        other_files = set()
+        for filename in build_data.get('bibliography_files', list()):
+            other_files.add(os.path.join(dirname, filename))
+
+        # unsaved text that is built instead of the file
+        snapshot = build_data.get('snapshot', dict())
+
+        hash_object = hashlib.sha256()
+        for option in ['latex_interpreter', 'use_latexmk', 'additional_arguments']:
+            hash_object.update((option + '=' + str(build_data[option]) + '\n').encode('utf-8'))
+
+        self.update_hash(hash_object, self.get_input_files(dirname, pending_files, snapshot) | other_files, snapshot)
+        return hash_object.hexdigest()
+
+    def get_input_files(self, dirname, pending_files, snapshot):
+        ''' pending_files and all files they include (transitively),
+            together with the bibliographies, packages and graphics they
+            use. Files in snapshot are read from there. '''
+
+        latex_files = set()
+        other_files = set()
+        pending_files = list(pending_files)
+        while len(pending_files) > 0:
+            filename = os.path.normpath(pending_files.pop())
+            if filename in latex_files: continue
+            latex_files.add(filename)
+
+            if filename in snapshot:
+                data = snapshot[filename].encode('utf-8')
+            else:
+                try:
+                    with open(filename, 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    continue
+            for match in self.input_regex.finditer(data.decode('utf-8', errors='replace')):
+                command, argument = match.group(1), match.group(2).strip()
+                if command in ['include', 'input', 'subfile', 'subimport']:
+                    if not argument.endswith('.tex'):
+                        argument += '.tex'
+                    pending_files.append(os.path.join(dirname, argument))
+                elif command == 'bibliography':
+                    for entry in argument.split(','):
+                        other_files.add(os.path.join(dirname, entry.strip() + '.bib'))
+                elif command == 'addbibresource':
+                    for entry in argument.split(','):
+                        other_files.add(os.path.join(dirname, entry.strip()))
+                elif command == 'usepackage':
+                    for entry in argument.split(','):
+                        other_files.add(os.path.join(dirname, entry.strip() + '.sty'))
+                elif command == 'includegraphics':
+                    for extension in self.graphics_extensions:
+                        other_files.add(os.path.join(dirname, argument + extension))
+
+        return latex_files | other_files
+
+    def update_hash(self, hash_object, filenames, snapshot):
+        for filename in sorted(set(os.path.normpath(filename) for filename in filenames)):
+            hash_object.update((filename + '\n').encode('utf-8'))
+            if filename in snapshot:
+                hash_object.update(hashlib.sha256(snapshot[filename].encode('utf-8')).digest())
+            else:
+                hash_object.update(self.get_file_digest(filename))
+
+    def get_file_digest(self, filename):
+        ''' Graphics only by size and modification time, they can be large. '''
+
+        try:
+            if filename.endswith('.tex') or filename.endswith('.bib') or filename.endswith('.sty'):
+                with open(filename, 'rb') as f:
+                    return hashlib.sha256(f.read()).digest()
+            else:
+                stat = os.stat(filename)
+                return (str(stat.st_size) + ':' + str(stat.st_mtime_ns)).encode('utf-8')
+        except OSError:
+            return b'missing'
+
+    def add_build_result(self, key, build_result):
+        with self.lock:
+            if build_result.get('error') != None or build_result.get('pdf_filename') == None:
+                self.invalidate()
+                return
+
+            try:
+                self.pdf_stat = self.get_stat(build_result['pdf_filename'])
+            except OSError:
+                self.invalidate()
+                return
+            self.key = key
+            self.build_result = build_result
+
+    def get_build_result(self, key, tex_filename):
+        ''' Returns a copy of the cached result if key matches and the pdf
+            and synctex file are still the ones from that build. '''
+
+        with self.lock:
+            if key == None or key != self.key: return None
+
+            try:
+                if self.get_stat(self.build_result['pdf_filename']) != self.pdf_stat:
+                    return None
+            except OSError:
+                return None
+
+            if self.build_result['has_synctex_file']:
+                folder = self.config_folder + '/' + base64.urlsafe_b64encode(str.encode(tex_filename)).decode()
+                synctex_filename = folder + '/' + os.path.splitext(os.path.basename(tex_filename))[0] + '.synctex.gz'
+                if not os.path.isfile(synctex_filename):
+                    return None
+
+            return dict(self.build_result)
+
+    def get_stat(self, filename):
+        stat = os.stat(filename)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def invalidate(self):
+        with self.lock:
+            self.key = None
+            self.build_result = None
+            self.pdf_stat = None
+
+
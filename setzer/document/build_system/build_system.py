@@ -15,11 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
-import gi
-from gi.repository import GObject
-
-import _thread as thread, queue
+import os.path
 import time
+import json
 
 from setzer.app.service_locator import ServiceLocator
 from setzer.dialogs.dialog_locator import DialogLocator
@@ -30,7 +28,11 @@ import setzer.document.build_system.builder.builder_build_makeindex as builder_b
 import setzer.document.build_system.builder.builder_build_glossaries as builder_build_glossaries
 import setzer.document.build_system.builder.builder_forward_sync as builder_forward_sync
 import setzer.document.build_system.builder.builder_backward_sync as builder_backward_sync
+import setzer.document.build_system.builder.builder_write_snapshot as builder_write_snapshot
+import setzer.document.build_system.builder.builder_build_format as builder_build_format
+import setzer.document.build_system.builder.builder_use_build_cache as builder_use_build_cache
 import setzer.document.build_system.query.query as query
+import setzer.document.build_system.build_cache.build_cache as build_cache
 from setzer.helpers.observable import Observable
 
 
@@ -59,7 +61,9 @@ class BuildSystem(Observable):
         self.can_sync = False
         self.update_can_sync()
 
-        self.build_log_data = {'items': list(), 'error_count': 0, 'warning_count': 0, 'badbox_count': 0}
+        self.build_log_data = {'items': list(), 'error_count': 0, 'warning_count': 0, 'badbox_count': 0, 'timings': list()}
+
+        self.build_cache = build_cache.BuildCache()
 
         self.builders = dict()
         self.builders['build_latex'] = builder_build_latex.BuilderBuildLaTeX()
@@ -69,10 +73,17 @@ class BuildSystem(Observable):
         self.builders['build_glossaries'] = builder_build_glossaries.BuilderBuildGlossaries()
         self.builders['forward_sync'] = builder_forward_sync.BuilderForwardSync()
         self.builders['backward_sync'] = builder_backward_sync.BuilderBackwardSync()
+        self.builders['write_snapshot'] = builder_write_snapshot.BuilderWriteSnapshot()
+        self.builders['build_format'] = builder_build_format.BuilderBuildFormat(self.build_cache)
+        self.builders['use_build_cache'] = builder_use_build_cache.BuilderUseBuildCache(self.build_cache)
 
-        self.document.preview.connect('pdf_changed', self.update_can_sync)
+        # jobs that can run at the same time when they are scheduled together
+        self.parallel_jobs = {'build_bibtex', 'build_biber', 'build_makeindex', 'build_glossaries'}
 
-        GObject.timeout_add(50, self.results_loop)
+        # auxiliary job -> hash of the input it last ran on
+        self.aux_job_input_hashes = dict()
+
+        self.document.preview.connect('pdf_changed', self.update_can_sync)
 
     def change_build_state(self, state):
         self.build_state = state
@@ -132,6 +143,14 @@ class BuildSystem(Observable):
         self.set_build_mode('build_and_forward_sync')
         self.start_building()
 
+    def build_in_background(self):
+        ''' Build the text in the editor without saving it and without
+            moving the preview, used when building on change. Returns the
+            query, None if nothing was started. '''
+
+        self.set_build_mode('build')
+        return self.start_building(from_snapshot=True)
+
     def set_build_log_items(self, log_items):
         build_log_items = list()
         error_count = 0
@@ -156,7 +175,7 @@ class BuildSystem(Observable):
                 if filename != self.document.filename:
                     add_items(build_log_items, log_items[filename], filename, item_type)
 
-        self.build_log_data = {'items': build_log_items, 'error_count': error_count, 'warning_count': warning_count, 'badbox_count': badbox_count}
+        self.build_log_data = {'items': build_log_items, 'error_count': error_count, 'warning_count': warning_count, 'badbox_count': badbox_count, 'timings': list()}
 
     def invalidate_build_log(self):
         self.add_change_code('build_log_update')
@@ -170,16 +189,30 @@ class BuildSystem(Observable):
     def get_badbox_count(self):
         return self.build_log_data['badbox_count']
 
-    def results_loop(self):
-        if self.active_query != None:
-            if self.active_query.is_done():
-                build_result = self.active_query.get_build_result()
-                forward_sync_result = self.active_query.get_forward_sync_result()
-                backward_sync_result = self.active_query.get_backward_sync_result()
-                if forward_sync_result != None or backward_sync_result != None or build_result != None:
-                    self.parse_result({'build': build_result, 'forward_sync': forward_sync_result, 'backward_sync': backward_sync_result})
-                self.active_query = None
-        return True
+    def get_timings(self):
+        return self.build_log_data.get('timings', list())
+
+    def export_timings(self, filename):
+        data = dict()
+        data['document'] = self.document.get_filename()
+        data['build_time'] = self.build_time
+        data['timings'] = self.get_timings()
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=4)
+
+    def on_query_done(self, query):
+        if query != self.active_query: return
+
+        build_result = query.get_build_result()
+        forward_sync_result = query.get_forward_sync_result()
+        backward_sync_result = query.get_backward_sync_result()
+        if build_result != None and 'cache_key' in query.build_data:
+            self.build_cache.add_build_result(query.build_data['cache_key'], build_result)
+        if 'aux_job_input_hashes' in query.build_data:
+            self.aux_job_input_hashes = query.build_data['aux_job_input_hashes']
+        if forward_sync_result != None or backward_sync_result != None or build_result != None:
+            self.parse_result({'build': build_result, 'forward_sync': forward_sync_result, 'backward_sync': backward_sync_result, 'timings': query.get_timings()})
+        self.active_query = None
 
     def parse_result(self, result_blob):
         if result_blob['build'] != None or result_blob['forward_sync'] != None:
@@ -212,6 +245,7 @@ class BuildSystem(Observable):
 
                 build_blob['log_messages']['BibTeX'] = build_blob['bibtex_log_messages']
                 self.set_build_log_items(build_blob['log_messages'])
+                self.build_log_data['timings'] = result_blob['timings']
                 self.build_time = time.time() - self.last_build_start_time
 
                 error_count = self.get_error_count()
@@ -244,23 +278,60 @@ class BuildSystem(Observable):
         if result_blob['build'] != None:
             self.invalidate_build_log()
 
+    def on_log_messages(self, query, log_items):
+        ''' Items found while the interpreter is still running. '''
+
+        if query != self.active_query: return False
+
+        self.set_build_log_items(log_items)
+        self.invalidate_build_log()
+        return False
+
     def add_query(self, query):
         self.stop_building(notify=False)
         self.active_query = query
-        thread.start_new_thread(self.execute_query, (query,))
+        query.log_messages_callback = self.on_log_messages
+        ServiceLocator.get_workspace().build_pool.submit(self.execute_query, (query,), self.on_query_done)
 
         self.change_build_state('building_in_progress')
 
     def execute_query(self, query):
-        while len(query.jobs) > 0:
-            if not query.force_building_to_stop:
-                self.builders[query.jobs.pop(0)].run(query)
+        while True:
+            with query.jobs_lock:
+                if query.force_building_to_stop or len(query.jobs) == 0: break
+                jobs = [query.jobs.pop(0)]
+                while jobs[0] in self.parallel_jobs and len(query.jobs) > 0 and query.jobs[0] in self.parallel_jobs:
+                    jobs.append(query.jobs.pop(0))
+            if len(jobs) == 1:
+                self.run_job(query, jobs[0])
+            else:
+                self.run_in_parallel(query, jobs)
         query.mark_done()
 
-    def start_building(self):
-        if self.build_mode == 'forward_sync' and not self.has_synctex_file: return
-        if self.build_mode == 'backward_sync' and self.backward_sync_data == None: return
-        if self.document.filename == None: return
+    def run_job(self, query, job):
+        time_start = time.time()
+        self.builders[job].run(query)
+        query.add_timing(job, time.time() - time_start)
+
+    def run_in_parallel(self, query, jobs):
+        ''' Auxiliary programs read different files and can run at the same
+            time, on the build pool. Each of them schedules a LaTeX pass
+            when it's done, only one is needed, none if one of them failed. '''
+
+        ServiceLocator.get_workspace().build_pool.run_together([(self.run_job, (query, job)) for job in jobs])
+
+        with query.jobs_lock:
+            has_latex_pass = False
+            while len(query.jobs) > 0 and query.jobs[0] == 'build_latex':
+                query.jobs.pop(0)
+                has_latex_pass = True
+            if has_latex_pass and query.get_build_result() == None:
+                query.jobs.insert(0, 'build_latex')
+
+    def start_building(self, from_snapshot=False):
+        if self.build_mode == 'forward_sync' and not self.has_synctex_file: return None
+        if self.build_mode == 'backward_sync' and self.backward_sync_data == None: return None
+        if self.document.filename == None: return None
 
         self.build_time = None
         mode = self.get_build_mode()
@@ -288,6 +359,9 @@ class BuildSystem(Observable):
 
             text = self.document.content.get_all_text()
             do_cleanup = self.settings.get_value('preferences', 'cleanup_build_files')
+            build_from_snapshot = (from_snapshot or self.settings.get_value('preferences', 'build_from_snapshot')) and interpreter != 'tectonic'
+            # formats with fonts loaded by lualatex can't be reused, tectonic has no -ini
+            use_preamble_format = self.settings.get_value('preferences', 'use_preamble_format') and interpreter in ['pdflatex', 'xelatex'] and not use_latexmk
 
         if mode == 'build':
             query_obj.jobs = ['build_latex']
@@ -322,11 +396,56 @@ class BuildSystem(Observable):
             query_obj.forward_sync_data['line'] = synctex_arguments['line']
             query_obj.forward_sync_data['line_offset'] = synctex_arguments['line_offset']
 
+        if mode in ['build', 'build_and_forward_sync']:
+            if build_from_snapshot:
+                query_obj.jobs.insert(0, 'write_snapshot')
+                query_obj.build_data['snapshot'], query_obj.build_data['snapshot_folders'] = self.get_snapshot(text)
+            # the preamble is taken from the text, it has to be the one that is built
+            if use_preamble_format and (build_from_snapshot or not self.document.content.get_modified()):
+                begin_document_offset = self.document.get_begin_document_offset()
+                if begin_document_offset != None and text.startswith('\\begin{document}', begin_document_offset):
+                    query_obj.jobs.insert(query_obj.jobs.index('build_latex'), 'build_format')
+                    query_obj.build_data['preamble'] = text[:begin_document_offset]
+            query_obj.build_data['aux_job_input_hashes'] = dict(self.aux_job_input_hashes)
+            # the files known to the parser, the cache key is computed by the first job
+            query_obj.build_data['included_latex_files'] = [filename for filename, offset in self.document.get_included_latex_files()]
+            query_obj.build_data['bibliography_files'] = list(self.document.get_bibliography_files())
+            query_obj.jobs.insert(0, 'use_build_cache')
+
         self.add_query(query_obj)
+        return query_obj
+
+    def get_snapshot(self, text):
+        ''' Text of the document and of modified open documents in its
+            folder by filename, and the subfolders of included files. '''
+
+        tex_filename = self.document.get_filename()
+        source_folder = os.path.dirname(tex_filename)
+
+        snapshot = {tex_filename: text}
+        for document in ServiceLocator.get_workspace().open_latex_documents:
+            filename = document.get_filename()
+            if document == self.document or filename == None: continue
+            if filename.startswith(source_folder + '/') and document.content.get_modified():
+                snapshot[filename] = document.content.get_all_text()
+
+        folders = set()
+        for filename, offset in self.document.get_included_latex_files():
+            folder = os.path.dirname(os.path.normpath(filename))
+            if folder != '' and not os.path.isabs(folder) and not folder.startswith('..'):
+                folders.add(folder)
+
+        return (snapshot, folders)
+
+    def stop_query(self, query):
+        ''' Stop building only if query is still the one running. '''
+
+        if query != None and query == self.active_query:
+            self.stop_building()
 
     def stop_building(self, notify=True):
         if self.active_query != None:
-            self.active_query.jobs = []
+            self.active_query.stop()
             self.active_query = None
         for builder in self.builders.values():
             builder.stop_running()
@@ -30,6 +30,17 @@ class BuilderBuild(object):
             query.build_result = {'error': error,
                                  'error_arg': error_arg}
 
+    def set_aux_job_result(self, query, job, success):
+        ''' An auxiliary job only counts as done for its input if it
+            succeeded, otherwise it runs again on the next build. '''
+
+        input_hash = query.build_data.get('aux_job_pending_hashes', dict()).pop(job, None)
+        aux_job_input_hashes = query.build_data.setdefault('aux_job_input_hashes', dict())
+        if success and input_hash != None:
+            aux_job_input_hashes[job] = input_hash
+        else:
+            aux_job_input_hashes.pop(job, None)
+
     def cleanup_files(self, query):
         if query.build_data['do_cleanup']:
             self.cleanup_build_files(query)
@@ -41,12 +52,12 @@ class BuilderBuild(object):
                         '.ist', '.glo', '.glg', '.acn', '.alg',
                         '.bcf', '.run.xml', '.out.ps']
         for ending in file_endings:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
+            try: os.remove(os.path.splitext(query.build_tex_filename)[0] + ending)
             except FileNotFoundError: pass
 
     def cleanup_glossaries_files(self, query):
         for ending in ['.gls', '.acr']:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
+            try: os.remove(os.path.splitext(query.build_tex_filename)[0] + ending)
             except FileNotFoundError: pass
 
 
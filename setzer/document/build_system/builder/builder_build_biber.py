@@ -30,7 +30,7 @@ class BuilderBuildBiber(builder_build.BuilderBuild):
         builder_build.BuilderBuild.__init__(self)
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = query.build_tex_filename
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['biber']
@@ -41,16 +41,19 @@ class BuilderBuildBiber(builder_build.BuilderBuild):
         custom_env = os.environ.copy()
         custom_env['BIBINPUTS'] = os.path.dirname(query.tex_filename) + ':' + os.path.dirname(tex_filename)
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env)
+            process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env)
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'biber missing')
             return
-        self.process.wait()
+        self.process = process
+        returncode = process.wait()
+        if query.force_building_to_stop: return
+        self.set_aux_job_result(query, 'build_biber', returncode == 0)
 
         self.parse_biber_log(query, tex_filename[:-3] + 'blg')
 
-        query.jobs.insert(0, 'build_latex')
+        query.add_jobs(['build_latex'])
 
     def stop_running(self):
         if self.process != None:
@@ -33,7 +33,7 @@ class BuilderBuildBibTeX(builder_build.BuilderBuild):
         self.bibtex_log_item_regex = ServiceLocator.get_regex_object(r'Warning--(.*)\n--line ([0-9]+) of file (.*)|I couldn' + "'" + r't open style file (.*)\n---line ([0-9]+) of file (.*)|Warning--(.*)')
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = query.build_tex_filename
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['bibtex']
@@ -41,16 +41,25 @@ class BuilderBuildBibTeX(builder_build.BuilderBuild):
 
         query.bibtex_data['ran_on_files'].append(filename)
 
+        # .bib and .bst files are looked up in the document folder when building from a snapshot
+        custom_env = os.environ.copy()
+        custom_env['BIBINPUTS'] = os.path.dirname(query.tex_filename) + ':' + os.environ.get('BIBINPUTS', '')
+        custom_env['BSTINPUTS'] = os.path.dirname(query.tex_filename) + ':' + os.environ.get('BSTINPUTS', '')
+
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env)
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'bibtex missing')
             return
-        self.process.wait()
+        self.process = process
+        returncode = process.wait()
+        if query.force_building_to_stop: return
+        # 1 means there were warnings, the .bbl file was still written
+        self.set_aux_job_result(query, 'build_bibtex', returncode in [0, 1])
 
         self.parse_bibtex_log(query, tex_filename[:-3] + 'blg')
-        query.jobs.insert(0, 'build_latex')
+        query.add_jobs(['build_latex'])
 
     def stop_running(self):
         if self.process != None:
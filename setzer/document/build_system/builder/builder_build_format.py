@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os
+import os.path
+import base64
+import hashlib
+import shutil
+import signal
+import subprocess
+
+import setzer.document.build_system.builder.builder_build as builder_build
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuilderBuildFormat(builder_build.BuilderBuild):
+    ''' Dumps the preamble of the document to a format file, the way
+        mylatexformat does. The format is cached by a hash of the preamble
+        and reused by build_latex until the preamble changes. When the
+        document is compiled with the format, \\documentclass skips
+        everything up to \\begin{document}, so line numbers and synctex
+        data stay those of the document. '''
+
+    def __init__(self, build_cache):
+        builder_build.BuilderBuild.__init__(self)
+
+        self.build_cache = build_cache
+        self.config_folder = ServiceLocator.get_config_folder()
+        self.process = None
+
+        # loaded into the format after the preamble, before \dump
+        self.skip_preamble_code = '''
+\\makeatletter
+\\def\\setzer@document{document}
+\\long\\def\\setzer@skippreamble#1\\begin#2{\\def\\setzer@environment{#2}\\ifx\\setzer@environment\\setzer@document\\expandafter\\setzer@endpreamble\\else\\expandafter\\setzer@skippreamble\\fi}
+\\def\\setzer@endpreamble{\\begin{document}}
+\\def\\documentclass{\\setzer@skippreamble}
+\\makeatother
+\\expandafter\\ifx\\csname @@dump\\endcsname\\relax\\expandafter\\dump\\else\\csname @@dump\\expandafter\\endcsname\\fi
+'''
+
+    def run(self, query):
+        latex_interpreter = query.build_data['latex_interpreter']
+        preamble = query.build_data['preamble']
+        folder = self.config_folder + '/formats/' + base64.urlsafe_b64encode(str.encode(query.tex_filename)).decode()
+        format_name = self.get_format_name(query)
+
+        if os.path.isfile(os.path.join(folder, format_name + '.fmt')):
+            query.build_data['format_filename'] = os.path.join(folder, format_name + '.fmt')
+            return
+        # don't try again for a preamble that can't be dumped
+        if os.path.isfile(os.path.join(folder, format_name + '.failed')):
+            return
+
+        try:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+            os.makedirs(folder)
+            with open(os.path.join(folder, format_name + '.tex'), 'w') as f:
+                f.write(preamble + self.skip_preamble_code)
+        except OSError:
+            return
+
+        arguments = [latex_interpreter, '-ini', '-interaction=nonstopmode']
+        arguments += query.build_data['additional_arguments'].split()
+        arguments.append('-jobname=' + format_name)
+        arguments.append('-output-directory=' + folder)
+        arguments.append('&' + latex_interpreter)
+        arguments.append(os.path.join(folder, format_name + '.tex'))
+
+        custom_env = os.environ.copy()
+        if query.build_tex_filename != query.tex_filename:
+            custom_env['TEXINPUTS'] = os.path.dirname(query.build_tex_filename) + ':' + os.environ.get('TEXINPUTS', '')
+
+        try:
+            process = subprocess.Popen(arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.path.dirname(query.tex_filename), env=custom_env, start_new_session=True)
+        except OSError:
+            return
+        self.process = process
+        return_code = process.wait()
+        if self.process == process:
+            self.process = None
+        # a stopped dump didn't fail, it's tried again next time
+        if query.force_building_to_stop: return
+
+        if return_code == 0 and os.path.isfile(os.path.join(folder, format_name + '.fmt')):
+            query.build_data['format_filename'] = os.path.join(folder, format_name + '.fmt')
+        else:
+            try:
+                open(os.path.join(folder, format_name + '.failed'), 'w').close()
+            except OSError:
+                pass
+
+    def get_format_name(self, query):
+        ''' Hash of everything a format depends on besides the preamble:
+            the files it includes, the interpreter binary, build options
+            and local packages. '''
+
+        hash_object = hashlib.sha256()
+        hash_object.update(query.build_data['preamble'].encode('utf-8'))
+        hash_object.update(query.build_data['additional_arguments'].encode('utf-8'))
+
+        # the preamble stands in for the root file
+        snapshot = dict(query.build_data.get('snapshot', dict()))
+        snapshot[query.tex_filename] = query.build_data['preamble']
+        input_files = self.build_cache.get_input_files(os.path.dirname(query.tex_filename), [query.tex_filename], snapshot)
+        self.build_cache.update_hash(hash_object, input_files, snapshot)
+
+        interpreter_path = shutil.which(query.build_data['latex_interpreter'])
+        hash_object.update(str(interpreter_path).encode('utf-8'))
+        if interpreter_path != None:
+            hash_object.update(str(os.stat(interpreter_path).st_mtime_ns).encode('utf-8'))
+
+        try:
+            entries = sorted(os.scandir(os.path.dirname(query.tex_filename)), key=lambda entry: entry.name)
+        except OSError:
+            entries = list()
+        for entry in entries:
+            if entry.name.endswith('.sty') or entry.name.endswith('.cls'):
+                hash_object.update((entry.name + ':' + str(entry.stat().st_mtime_ns) + '\n').encode('utf-8'))
+
+        return 'preamble-' + hash_object.hexdigest()[:16]
+
+    def stop_running(self):
+        process = self.process
+        self.process = None
+        if process != None:
+            try: os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+            except ProcessLookupError: pass
+
+
@@ -15,16 +15,27 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import gi
+from gi.repository import GLib
+
 import os
 import os.path
 import sys
+import time
 import base64
+import re
+import gzip
 import shutil
-import pexpect
+import shlex
+import select
+import codecs
+import signal
+import subprocess
 from operator import itemgetter
 
 import setzer.document.build_system.builder.builder_build as builder_build
 import setzer.document.build_system.latex_log_parser.latex_log_parser as latex_log_parser
+import setzer.document.build_system.latex_log_parser.latex_log_stream_parser as latex_log_stream_parser
 from setzer.app.service_locator import ServiceLocator
 
 
@@ -36,7 +47,18 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
         self.config_folder = ServiceLocator.get_config_folder()
         self.latex_log_parser = latex_log_parser.LaTeXLogParser()
 
+        # seconds between build log updates while the interpreter runs
+        self.log_update_interval = 0.25
+
+        # options for passes that only update the auxiliary files
+        self.draft_mode_options = dict()
+        self.draft_mode_options['pdflatex'] = ' -draftmode'
+        self.draft_mode_options['xelatex'] = ' -no-pdf'
+        self.draft_mode_options['lualatex'] = ' --draftmode'
+
     def run(self, query):
+        query.build_data['latex_pass'] = query.build_data.get('latex_pass', 0) + 1
+
         build_command_defaults = dict()
         build_command_defaults['pdflatex'] = 'pdflatex -synctex=1 -interaction=nonstopmode'
         build_command_defaults['xelatex'] = 'xelatex -synctex=1 -interaction=nonstopmode'
@@ -44,9 +66,10 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
         build_command_defaults['tectonic'] = 'tectonic --synctex --keep-logs'
         latex_interpreter = query.build_data['latex_interpreter']
 
+        tex_filename = query.build_tex_filename
         if latex_interpreter == 'tectonic':
             build_command = build_command_defaults[latex_interpreter]
-            build_command += ' --outdir "' + os.path.dirname(query.tex_filename) + '" "' 
+            build_command += ' --outdir "' + os.path.dirname(tex_filename) + '" "' 
         elif query.build_data['use_latexmk']:
             if latex_interpreter == 'pdflatex':
                 interpreter_option = 'pdf'
@@ -54,48 +77,68 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
                 interpreter_option = latex_interpreter
             build_command = 'latexmk -' + interpreter_option + ' -synctex=1 -interaction=nonstopmode'
             build_command += query.build_data['additional_arguments']
-            build_command += ' -output-directory="' + os.path.dirname(query.tex_filename) + '" "'
+            build_command += ' -output-directory="' + os.path.dirname(tex_filename) + '" "'
         else:
             build_command = build_command_defaults[latex_interpreter]
             build_command += query.build_data['additional_arguments']
-            build_command += ' -output-directory="' + os.path.dirname(query.tex_filename) + '" "'
-        build_command += query.tex_filename + '"'
+            if query.build_data.get('draft_mode', False):
+                build_command += self.draft_mode_options[latex_interpreter]
+            if query.build_data.get('format_filename') != None:
+                build_command += ' -fmt="' + os.path.basename(query.build_data['format_filename']).rsplit('.fmt', 1)[0] + '"'
+            build_command += ' -output-directory="' + os.path.dirname(tex_filename) + '" "'
+        build_command += tex_filename + '"'
+
+        # files in the snapshot are found before the ones in the document folder
+        custom_env = os.environ.copy()
+        if tex_filename != query.tex_filename:
+            custom_env['TEXINPUTS'] = os.path.dirname(tex_filename) + ':' + os.environ.get('TEXINPUTS', '')
+        if query.build_data.get('format_filename') != None:
+            custom_env['TEXFORMATS'] = os.path.dirname(query.build_data['format_filename']) + ':' + os.environ.get('TEXFORMATS', '')
+
+        query.build_data['latex_input_hashes'] = self.latex_log_parser.get_file_hashes(tex_filename)
 
         try:
-            self.process = pexpect.spawn(build_command, cwd=os.path.dirname(query.tex_filename))
-        except pexpect.exceptions.ExceptionPexpect:
+            process = subprocess.Popen(shlex.split(build_command), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(query.tex_filename), env=custom_env, start_new_session=True)
+        except OSError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_missing', latex_interpreter)
             return
 
-        while True:
-            try:
-                out = self.process.expect(['\r\n\r\n', pexpect.TIMEOUT, pexpect.EOF], timeout=20)
-            except AttributeError:
-                break
-            if out == 0:
-                pass
-            elif out == 1:
-                for line in self.process.before.split(b'\n'):
-                    if line.startswith(b'!'):
-                        self.process.sendcontrol('c')
-                        self.process.sendline('x')
-            else:
-                break
+        self.process = process
+        time_start = time.time()
+        self.read_output(process, query)
+        query.add_timing('build_latex', time.time() - time_start, 'interpreter')
+        # the process group is gone, its id may be reused
+        if self.process == process:
+            self.process = None
+
+        # a newer query may already use the build folder
+        if query.force_building_to_stop: return
 
         # parse results
+        time_start = time.time()
         try:
             if self.parse_build_log(query):
+                query.add_timing('build_latex', time.time() - time_start, 'parse_log')
                 return
         except FileNotFoundError as e:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'log file missing')
             return
+        query.add_timing('build_latex', time.time() - time_start, 'parse_log')
 
+        time_start = time.time()
         query.can_sync = self.copy_synctex_file(query)
-        self.cleanup_files(query)
+        query.add_timing('build_latex', time.time() - time_start, 'copy_synctex')
 
         pdf_filename = query.tex_filename.rsplit('.tex', 1)[0] + '.pdf'
+        if tex_filename != query.tex_filename:
+            try: shutil.copyfile(tex_filename.rsplit('.tex', 1)[0] + '.pdf', pdf_filename)
+            except FileNotFoundError: pass
+        time_start = time.time()
+        self.cleanup_files(query)
+        query.add_timing('build_latex', time.time() - time_start, 'cleanup')
+
         if query.error_count > 0:
             if os.path.isfile(pdf_filename):
                 os.remove(pdf_filename)
@@ -109,23 +152,76 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
                                   'error': None,
                                   'error_arg': None}
 
+    def read_output(self, process, query):
+        ''' Read the interpreter output as it arrives and show the items
+            found so far in the build log. The interpreter runs in
+            nonstopmode and never waits for input. '''
+
+        file_descriptor = process.stdout.fileno()
+        os.set_blocking(file_descriptor, False)
+        # characters can be split between two reads
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        stream_parser = latex_log_stream_parser.LaTeXLogStreamParser(self.latex_log_parser, query.build_tex_filename, os.path.dirname(query.tex_filename))
+        last_log_update = 0
+
+        while True:
+            try:
+                readable = select.select([file_descriptor], [], [], 1)[0]
+            except (OSError, ValueError):
+                break
+            if time.time() - last_log_update >= self.log_update_interval and query.log_messages_callback != None:
+                log_items = stream_parser.get_new_log_items()
+                if log_items != None:
+                    GLib.idle_add(query.log_messages_callback, query, self.get_source_log_items(query, log_items))
+                    last_log_update = time.time()
+            if len(readable) == 0:
+                if process.poll() != None: break
+                continue
+            try:
+                data = os.read(file_descriptor, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            if len(data) == 0: break
+
+            stream_parser.feed(decoder.decode(data))
+
+        stream_parser.feed(decoder.decode(b'', final=True))
+        process.wait()
+
     def stop_running(self):
-        if self.process != None:
-            self.process.sendcontrol('c')
-            self.process.sendline('x')
-            self.process.terminate(True)
-            self.process = None
+        ''' latexmk starts the interpreter in its own process, the whole
+            process group is stopped. '''
+
+        process = self.process
+        self.process = None
+        if process != None:
+            try: os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+            except ProcessLookupError: pass
 
     def parse_build_log(self, query):
         query.log_messages = list()
         query.error_count = 0
+        was_draft_mode = query.build_data.get('draft_mode', False)
+        query.build_data['draft_mode'] = False
 
-        log_items = self.latex_log_parser.parse_build_log(query.tex_filename)
+        log_items = self.latex_log_parser.parse_build_log(query.build_tex_filename, os.path.dirname(query.tex_filename))
         additional_jobs = self.latex_log_parser.get_additional_jobs(log_items, query)
+        log_items = self.get_source_log_items(query, log_items)
         file_no = 0
 
-        for job in additional_jobs:
-            query.jobs.insert(0, job)
+        if len(additional_jobs) > 0:
+            query.add_jobs(additional_jobs)
+            # the pass after an auxiliary program reads its output for the
+            # first time and almost always has to be rerun
+            if additional_jobs != ['build_latex'] and self.can_use_draft_mode(query):
+                query.build_data['draft_mode'] = True
+            return True
+
+        # the draft pass didn't write a pdf
+        if was_draft_mode:
+            query.add_jobs(['build_latex'])
             return True
 
         for filename, items in log_items.items():
@@ -137,16 +233,45 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
 
         return False
 
+    def can_use_draft_mode(self, query):
+        return query.build_data['latex_interpreter'] in self.draft_mode_options and not query.build_data['use_latexmk']
+
+    def get_source_log_items(self, query, log_items):
+        source_log_items = dict()
+        for filename, items in log_items.items():
+            source_log_items[query.get_source_filename(filename)] = items
+        return source_log_items
+
     def copy_synctex_file(self, query):
-        move_from = os.path.splitext(query.tex_filename)[0] + '.synctex.gz'
+        ''' Copies the synctex file to the config folder. When building
+            from a snapshot, the files in the build folder are replaced
+            by the ones in the document folder. '''
+
+        move_from = os.path.splitext(query.build_tex_filename)[0] + '.synctex.gz'
         folder = self.config_folder + '/' + base64.urlsafe_b64encode(str.encode(query.tex_filename)).decode()
         move_to = folder + '/' + os.path.splitext(os.path.basename(query.tex_filename))[0] + '.synctex.gz'
 
         if not os.path.exists(folder):
             os.makedirs(folder)
 
-        try: shutil.copyfile(move_from, move_to)
-        except FileNotFoundError: return False
-        else: return True
+        if query.build_tex_filename == query.tex_filename:
+            try: shutil.copyfile(move_from, move_to)
+            except FileNotFoundError: return False
+            else: return True
+
+        build_folder = os.path.dirname(query.build_tex_filename).encode('utf-8')
+        source_folder = os.path.dirname(query.tex_filename).encode('utf-8')
+        input_regex = ServiceLocator.get_regex_object(rb'^(Input:[0-9]+:)' + re.escape(build_folder) + rb'/')
+        try:
+            with gzip.open(move_from, 'rb') as f:
+                lines = f.read().split(b'\n')
+        except (FileNotFoundError, OSError, EOFError):
+            return False
+        for index, line in enumerate(lines):
+            if line.startswith(b'Input:'):
+                lines[index] = input_regex.sub(lambda match: match.group(1) + source_folder + b'/', line)
+        with gzip.open(move_to, 'wb') as f:
+            f.write(b'\n'.join(lines))
+        return True
 
 
@@ -32,7 +32,7 @@ class BuilderBuildMakeindex(builder_build.BuilderBuild):
         self.bibtex_log_item_regex = ServiceLocator.get_regex_object(r'Warning--(.*)\n--line ([0-9]+) of file (.*)|I couldn' + "'" + r't open style file (.*)\n---line ([0-9]+) of file (.*)')
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = query.build_tex_filename
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['makeindex']
@@ -41,14 +41,17 @@ class BuilderBuildMakeindex(builder_build.BuilderBuild):
         query.makeindex_data['ran_on_files'].append(filename)
 
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'makeindex missing')
             return
-        self.process.wait()
+        self.process = process
+        returncode = process.wait()
+        if query.force_building_to_stop: return
+        self.set_aux_job_result(query, 'build_makeindex', returncode == 0)
 
-        query.jobs.insert(0, 'build_latex')
+        query.add_jobs(['build_latex'])
 
     def stop_running(self):
         if self.process != None:
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import setzer.document.build_system.builder.builder_build as builder_build
+
+
+class BuilderUseBuildCache(builder_build.BuilderBuild):
+    ''' First job of a build. Hashes everything that goes into it and
+        skips running the interpreter if nothing changed since the last
+        successful build. Runs in a build pool worker, because the hash
+        reads all included files. '''
+
+    def __init__(self, build_cache):
+        builder_build.BuilderBuild.__init__(self)
+
+        self.build_cache = build_cache
+
+    def run(self, query):
+        cache_key = self.build_cache.get_key(query.tex_filename, query.build_data)
+        query.build_data['cache_key'] = cache_key
+
+        build_result = self.build_cache.get_build_result(cache_key, query.tex_filename)
+        if build_result == None: return
+
+        with query.jobs_lock:
+            if query.force_building_to_stop: return
+            for job in ['write_snapshot', 'build_format', 'build_latex']:
+                if job in query.jobs:
+                    query.jobs.remove(job)
+        with query.build_result_lock:
+            query.build_result = build_result
+        query.can_sync = build_result['has_synctex_file']
+
+    def stop_running(self):
+        pass
+
+
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os
+import os.path
+import base64
+
+import setzer.document.build_system.builder.builder_build as builder_build
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuilderWriteSnapshot(builder_build.BuilderBuild):
+    ''' Writes the text of the document and of modified open documents
+        it includes to a private build folder, so they can be built
+        without saving. Files that aren't in the snapshot are read from
+        the document folder. '''
+
+    def __init__(self):
+        builder_build.BuilderBuild.__init__(self)
+
+        self.cache_folder = ServiceLocator.get_cache_folder()
+
+    def run(self, query):
+        source_folder = os.path.dirname(query.tex_filename)
+        build_folder = self.cache_folder + '/build/' + base64.urlsafe_b64encode(str.encode(query.tex_filename)).decode()
+
+        written_files = set()
+        try:
+            for filename, text in query.build_data['snapshot'].items():
+                build_filename = os.path.join(build_folder, os.path.relpath(filename, source_folder))
+                os.makedirs(os.path.dirname(build_filename), exist_ok=True)
+                with open(build_filename, 'w') as f:
+                    f.write(text)
+                written_files.add(build_filename)
+
+            # latex writes the .aux files of included files to the same subfolders
+            for folder in query.build_data['snapshot_folders']:
+                os.makedirs(os.path.join(build_folder, folder), exist_ok=True)
+
+            # copies from earlier builds would hide the saved files
+            for dirpath, dirnames, filenames in os.walk(build_folder):
+                for filename in filenames:
+                    filename = os.path.join(dirpath, filename)
+                    if filename.endswith('.tex') and filename not in written_files:
+                        os.remove(filename)
+        except OSError:
+            # build the saved files instead
+            return
+
+        query.build_tex_filename = os.path.join(build_folder, os.path.basename(query.tex_filename))
+
+    def stop_running(self):
+        pass
+
+
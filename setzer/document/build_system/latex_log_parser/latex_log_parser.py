@@ -15,7 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import os
 import os.path
+import re
+import mmap
+import hashlib
 
 import setzer.helpers.path as path_helpers
 from setzer.app.service_locator import ServiceLocator
@@ -24,102 +28,144 @@ from setzer.app.service_locator import ServiceLocator
 class LaTeXLogParser():
 
     def __init__(self):
-        self.doc_regex = ServiceLocator.get_regex_object(r'(\(([^\(\)]*\.(?:tex|gls)))')
-        self.item_regex = ServiceLocator.get_regex_object(r'((?<!.) *' + 
+        paren_pattern = r'\(([^\(\)]*\.(?:tex|gls))|\(|\)'
+        item_pattern = (r'((?<!.) *' + 
     r'(?:Overfull \\hbox|Underfull \\hbox|' + 
     r'No file .*\.|File .* does not exist\.|' +
     r'(?:LaTeX|pdfTeX|LuaTeX|Package|Class) .*Warning.*:|LaTeX Font Warning:|' +
     r'!(?: )(?:LaTeX|pdfTeX|LuaTeX|Package|Class) error|' +
     r'! ).*\n)')
+        self.paren_regex = ServiceLocator.get_regex_object(paren_pattern)
+        self.item_regex = ServiceLocator.get_regex_object(item_pattern)
+        # the same on bytes, for scanning the log without decoding it
+        self.paren_regex_bytes = ServiceLocator.get_regex_object(paren_pattern.encode('ascii'))
+        self.item_regex_bytes = ServiceLocator.get_regex_object(item_pattern.encode('ascii'))
         self.badbox_line_number_regex = ServiceLocator.get_regex_object(r'lines ([0-9]+)--([0-9]+)')
         self.other_line_number_regex = ServiceLocator.get_regex_object(r'(l\.| input line \n| input line )([0-9]+)( |\.)')
 
-    def parse_build_log(self, tex_filename):
-        log_filename = os.path.dirname(tex_filename) + '/' + os.path.basename(tex_filename).rsplit('.tex', 1)[0] + '.log'
-        try: file = open(log_filename, 'rb')
-        except FileNotFoundError as e: raise e
-        else:
-            text = file.read().decode('utf-8', errors='ignore')
+        # (item text, job, file the job depends on, reason for rerunning latex),
+        # {name} is replaced by the name of the document without extension.
+        # For latex the dependency is a file written during the last pass,
+        # for other jobs it's their input.
+        self.job_rules = list()
+        self.job_rules.append((r'No file {name}\.bbl\.', 'build_bibtex', '.aux', None))
+        self.job_rules.append((r'No file {name}\.ind\.', 'build_makeindex', '.idx', None))
+        self.job_rules.append((r'Please \(re\)run Biber on the file:\n.*{name}.*', 'build_biber', '.bcf', None))
+        self.job_rules.append((r'File `{name}\.out\' has changed\.', 'build_latex', '.out', 1))
+        self.job_rules.append((r'Please rerun LaTeX\.', 'build_latex', '.aux', 2))
+        self.job_rules.append((r'Label\(s\) may have changed\. Rerun to get cross-references right\.', 'build_latex', '.aux', 3))
+        self.job_rules.append((r'There were undefined references\.', 'build_latex', '.aux', 3))
+        self.job_rules.append((r'Citation\(s\) may have changed\.', 'build_latex', '.aux', 4))
+        self.job_rules.append((r'No file {name}\.toc\.', 'build_latex', '.toc', 5))
+        self.job_rules.append((r'No file {name}\.aux\.', 'build_latex', '.aux', 5))
+        self.job_rules.append((r'Rerun to get transparencies right\.', 'build_latex', None, 6))
+        self.job_rules.append((r'No file {name}\.(?:gls|acr)\.', 'build_glossaries', '.glo', None))
+        self.aux_job_outputs = {'build_bibtex': '.bbl', 'build_makeindex': '.ind', 'build_biber': '.bbl', 'build_glossaries': '.gls'}
+
+        # the first lines of an item, enough to find its line number, see bl_get_line_number
+        self.item_lines_regex_bytes = ServiceLocator.get_regex_object(rb'(?:[^\n]*\n){0,12}[^\n]*')
+
+    def parse_build_log(self, tex_filename, dirname=None):
+        ''' The log is memory mapped and scanned as bytes, only the items
+            found are decoded. Relative file names in the log are resolved
+            against dirname, the folder of tex_filename by default. '''
 
-        doc_texts = self.split_log_text_by_file(text, tex_filename)
+        log_filename = os.path.dirname(tex_filename) + '/' + os.path.basename(tex_filename).rsplit('.tex', 1)[0] + '.log'
+        with open(log_filename, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                data = b''
+            else:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
-        log_items = dict()
-        for filename, text in doc_texts.items():
-            filename = ''.join(filename.splitlines())
-            log_items[filename] = self.parse_log_text(filename, text)
+        try:
+            log_items = dict()
+            for filename, spans in self.get_spans_by_file(data, tex_filename, dirname).items():
+                log_items[filename] = self.parse_log_spans(data, spans)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
 
         return log_items
 
     def get_additional_jobs(self, log_items, query):
+        ''' Matches the log items against job_rules. Auxiliary programs
+            only run if their output is missing or their input changed
+            since they last ran, LaTeX is only rerun if the file the reason
+            depends on changed during the last pass. Returns all auxiliary
+            jobs that are due, they don't depend on each other. '''
+
+        basename = os.path.basename(query.build_tex_filename).rsplit('.', 1)[0]
+        base_filename = os.path.splitext(query.build_tex_filename)[0]
+        rules_regex = self.get_job_rules_regex(basename)
+        latex_input_hashes = query.build_data.get('latex_input_hashes', dict())
+        aux_job_input_hashes = query.build_data.setdefault('aux_job_input_hashes', dict())
+        file_hashes = dict()
+
+        def get_file_hash(extension):
+            if extension not in file_hashes:
+                file_hashes[extension] = self.get_file_hash(base_filename + extension)
+            return file_hashes[extension]
+
         jobs = set()
         rerun_latex_reasons = set()
+        # auxiliary job -> hash of its input
+        aux_jobs = dict()
         for filename, items in log_items.items():
             for item in items['error'] + items['warning']:
-
-                if item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and item[2].find('.bbl.') >= 0:
-                    if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.bibtex_data['ran_on_files']:
-                        jobs |= {'build_bibtex'}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and item[2].find('.ind.') >= 0:
-                    if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.makeindex_data['ran_on_files']:
-                        jobs |= {'build_makeindex'}
-
-                elif item[2] == 'Please (re)run Biber on the file:':
-                    line = item[3]
-                    if line.find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0:
-                        if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.biber_data['ran_on_files']:
-                            jobs |= {'build_biber'}
-
-                elif item[2] == 'File `' + query.tex_filename.rsplit('/', 1)[1][:-4] + '.out\' has changed.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {1}
-
-                elif item[2] == 'Please rerun LaTeX.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {2}
-
-                elif item[2] == 'Label(s) may have changed. Rerun to get cross-references right.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {3}
-
-                elif item[2] == 'There were undefined references.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {3}
-
-                elif item[2] == 'Citation(s) may have changed.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {4}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.toc.') >= 0 or item[2].find('.aux.') >= 0):
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {5}
-
-                elif item[2] == 'Rerun to get transparencies right.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {6}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.gls.') >= 0 or item[2].find('.acr.') >= 0):
-                    jobs |= {'build_glossaries'}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.aux.') >= 0):
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {7}
-
-        if 'build_biber' in jobs:
-            return {'build_biber'}
-        if 'build_bibtex' in jobs:
-            return {'build_bibtex'}
-        if 'build_makeindex' in jobs:
-            return {'build_makeindex'}
-        if 'build_glossaries' in jobs:
-            return {'build_glossaries'}
+                match = rules_regex.fullmatch('\n'.join(item[2:]))
+                if match == None: continue
+
+                pattern, job, dependency, reason = self.job_rules[int(match.lastgroup[4:])]
+                if job == 'build_latex':
+                    if dependency == None or get_file_hash(dependency) != latex_input_hashes.get(dependency):
+                        jobs |= {'build_latex'}
+                        rerun_latex_reasons |= {reason}
+                elif basename not in self.get_job_data(query, job)['ran_on_files']:
+                    if not os.path.isfile(base_filename + self.aux_job_outputs[job]) or get_file_hash(dependency) != aux_job_input_hashes.get(job):
+                        aux_jobs[job] = get_file_hash(dependency)
+
+        # both write the .bbl file
+        if 'build_biber' in aux_jobs and 'build_bibtex' in aux_jobs:
+            del(aux_jobs['build_bibtex'])
+        if len(aux_jobs) > 0:
+            # recorded in aux_job_input_hashes once the job succeeded
+            query.build_data.setdefault('aux_job_pending_hashes', dict()).update(aux_jobs)
+            return [job for job in ['build_biber', 'build_bibtex', 'build_makeindex', 'build_glossaries'] if job in aux_jobs]
         if 'build_latex' in jobs:
             if len(rerun_latex_reasons - query.build_data['rerun_latex_reasons']) > 0:
                 query.build_data['rerun_latex_reasons'] = rerun_latex_reasons
-                return {'build_latex'}
-            else:
-                jobs -= {'build_latex'}
-        return jobs
+                return ['build_latex']
+        return []
+
+    def get_job_rules_regex(self, basename):
+        patterns = list()
+        for index, rule in enumerate(self.job_rules):
+            patterns.append('(?P<rule' + str(index) + '>' + rule[0].replace('{name}', re.escape(basename)) + ')')
+        return ServiceLocator.get_regex_object('|'.join(patterns))
+
+    def get_job_data(self, query, job):
+        if job == 'build_bibtex': return query.bibtex_data
+        if job == 'build_biber': return query.biber_data
+        if job == 'build_makeindex': return query.makeindex_data
+        if job == 'build_glossaries': return query.glossaries_data
+
+    def get_file_hashes(self, tex_filename):
+        ''' Content hashes of the files LaTeX reruns depend on, taken
+            before each pass. '''
+
+        base_filename = os.path.splitext(tex_filename)[0]
+        file_hashes = dict()
+        for pattern, job, dependency, reason in self.job_rules:
+            if job == 'build_latex' and dependency != None:
+                file_hashes[dependency] = self.get_file_hash(base_filename + dependency)
+        return file_hashes
+
+    def get_file_hash(self, filename):
+        try:
+            with open(filename, 'rb') as file:
+                return hashlib.sha256(file.read()).digest()
+        except OSError:
+            return None
 
     def parse_log_text(self, filename, text):
         log_messages = {'error': list(), 'warning': list(), 'badbox': list()}
@@ -129,98 +175,113 @@ class LaTeXLogParser():
             if not self.item_regex.fullmatch(match):
                 buffer += match
             else:
-                match += buffer
+                self.parse_log_item(log_messages, match + buffer)
                 buffer = ''
-                matchiter = iter(match.splitlines())
-                line = next(matchiter)
-
-                if line.startswith('No file '):
-                    text = line.strip()
-                    line_number = -1
-                    log_messages['error'].append((None, line_number, text))
-
-                elif line.startswith('Package biblatex Warning: Please (re)run Biber on the file:'):
-                    text = line[26:].strip()
-                    line = next(matchiter)
-                    log_messages['warning'].append((None, -1, text, line))
-
-                elif line.startswith('Package biblatex Warning: Please rerun LaTeX.'):
-                    text = line[26:].strip()
-                    log_messages['warning'].append((None, -1, text))
-
-                elif line.startswith('LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.'):
-                    text = line[15:].strip()
-                    log_messages['warning'].append((None, -1, text))
-
-                elif line.startswith('Package natbib Warning: Citation(s) may have changed.'):
-                    text = line[24:].strip()
-                    log_messages['warning'].append((None, -1, text))
-
-                elif line.startswith('Overfull \hbox'):
-                    line_number_match = self.badbox_line_number_regex.search(line)
-                    if line_number_match != None:
-                        line_number = int(line_number_match.group(1))
-                        text = line.strip()
-                        log_messages['badbox'].append((None, line_number, text))
-
-                elif line.startswith('Underfull \hbox'):
-                    line_number_match = self.badbox_line_number_regex.search(line)
-                    if line_number_match != None:
-                        line_number = int(line_number_match.group(1))
-                        text = line.strip()
-                        log_messages['badbox'].append((None, line_number, text))
-
-                elif line.startswith('LaTeX Warning: Reference '):
-                    text = line[15:].strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['warning'].append(('Undefined Reference', line_number, text))
-
-                elif line.startswith('Package '):
-                    text = line.split(':')[1].strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['warning'].append((None, line_number, text))
-
-                elif line.startswith('LaTeX Warning: '):
-                    text = line[15:].strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['warning'].append((None, line_number, text))
-
-                elif line.startswith('! Undefined control sequence'):
-                    text = line.strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['error'].append(('Undefined control sequence', line_number, text))
-
-                elif line.startswith('! LaTeX Error') or line.startswith('!pdfTeX error'):
-                    text = line[15:].strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['error'].append((None, line_number, text))
-
-                elif line.startswith('! Package'):
-                    text = self.get_text(line[2:], matchiter, True)
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['error'].append(('Undefined control sequence', line_number, text))
-
-                elif line.startswith('File') and line.endswith(' does not exist.\n'):
-                    text = line.strip()
-                    line_number = -1
-                    log_messages['error'].append((None, line_number, text))
-
-                elif line.startswith('! I can\'t find file\.'):
-                    text = line.strip()
-                    line_number = -1
-                    log_messages['error'].append((None, line_number, text))
-
-                elif line.startswith('! File'):
-                    text = self.get_text(line[2:])
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['error'].append((None, line_number, text))
-
-                elif line.startswith('! ') and not line.startswith('!  ==> Fatal'):
-                    text = line[2:].strip()
-                    line_number = self.bl_get_line_number(line, matchiter)
-                    log_messages['error'].append((None, line_number, text))
         return log_messages
 
+    def parse_log_spans(self, data, spans):
+        ''' Same as parse_log_text, for the parts of the log data (bytes
+            or mmap) that belong to one file. Only the first lines of each
+            item are decoded. '''
+
+        log_messages = {'error': list(), 'warning': list(), 'badbox': list()}
+        for start, end in reversed(spans):
+            for match in reversed(list(self.item_regex_bytes.finditer(data, start, end))):
+                item_end = self.item_lines_regex_bytes.match(data, match.start(), end).end()
+                self.parse_log_item(log_messages, data[match.start():item_end].decode('utf-8', errors='ignore'))
+                end = match.start()
+        return log_messages
+
+    def parse_log_item(self, log_messages, item_text):
+        matchiter = iter(item_text.splitlines())
+        line = next(matchiter)
+
+        if line.startswith('No file '):
+            text = line.strip()
+            line_number = -1
+            log_messages['error'].append((None, line_number, text))
+
+        elif line.startswith('Package biblatex Warning: Please (re)run Biber on the file:'):
+            text = line[26:].strip()
+            line = next(matchiter)
+            log_messages['warning'].append((None, -1, text, line))
+
+        elif line.startswith('Package biblatex Warning: Please rerun LaTeX.'):
+            text = line[26:].strip()
+            log_messages['warning'].append((None, -1, text))
+
+        elif line.startswith('LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.'):
+            text = line[15:].strip()
+            log_messages['warning'].append((None, -1, text))
+
+        elif line.startswith('Package natbib Warning: Citation(s) may have changed.'):
+            text = line[24:].strip()
+            log_messages['warning'].append((None, -1, text))
+
+        elif line.startswith('Overfull \hbox'):
+            line_number_match = self.badbox_line_number_regex.search(line)
+            if line_number_match != None:
+                line_number = int(line_number_match.group(1))
+                text = line.strip()
+                log_messages['badbox'].append((None, line_number, text))
+
+        elif line.startswith('Underfull \hbox'):
+            line_number_match = self.badbox_line_number_regex.search(line)
+            if line_number_match != None:
+                line_number = int(line_number_match.group(1))
+                text = line.strip()
+                log_messages['badbox'].append((None, line_number, text))
+
+        elif line.startswith('LaTeX Warning: Reference '):
+            text = line[15:].strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['warning'].append(('Undefined Reference', line_number, text))
+
+        elif line.startswith('Package '):
+            text = line.split(':')[1].strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['warning'].append((None, line_number, text))
+
+        elif line.startswith('LaTeX Warning: '):
+            text = line[15:].strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['warning'].append((None, line_number, text))
+
+        elif line.startswith('! Undefined control sequence'):
+            text = line.strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['error'].append(('Undefined control sequence', line_number, text))
+
+        elif line.startswith('! LaTeX Error') or line.startswith('!pdfTeX error'):
+            text = line[15:].strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['error'].append((None, line_number, text))
+
+        elif line.startswith('! Package'):
+            text = self.get_text(line[2:], matchiter, True)
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['error'].append(('Undefined control sequence', line_number, text))
+
+        elif line.startswith('File') and line.endswith(' does not exist.\n'):
+            text = line.strip()
+            line_number = -1
+            log_messages['error'].append((None, line_number, text))
+
+        elif line.startswith('! I can\'t find file\.'):
+            text = line.strip()
+            line_number = -1
+            log_messages['error'].append((None, line_number, text))
+
+        elif line.startswith('! File'):
+            text = self.get_text(line[2:])
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['error'].append((None, line_number, text))
+
+        elif line.startswith('! ') and not line.startswith('!  ==> Fatal'):
+            text = line[2:].strip()
+            line_number = self.bl_get_line_number(line, matchiter)
+            log_messages['error'].append((None, line_number, text))
+
     def get_text(self, line, matchiter=None, can_be_multiline=False):
         if can_be_multiline:
             text = line.strip()
@@ -235,37 +296,60 @@ class LaTeXLogParser():
 
     def split_log_text_by_file(self, log_text, tex_filename):
         doc_texts = dict()
+        for filename, spans in self.get_spans_by_file(log_text, tex_filename).items():
+            doc_texts[filename] = ''.join(log_text[start:end] for start, end in spans)
+        return doc_texts
 
-        matches = self.doc_regex.split(log_text)
-        buffer = ''
-        for match in reversed(matches):
-            if not self.doc_regex.fullmatch(match):
-                buffer += match
-            else:
-                match = match.strip() + buffer
-                buffer = ''
-                filename = self.doc_regex.match(match).group(2).strip()
+    def get_spans_by_file(self, data, tex_filename, dirname=None):
+        ''' Assigns each part of the log to the input file that was open
+            when it was written, in one pass over the parentheses. Text of
+            a .tex or .gls file runs from its opening to its closing
+            parenthesis, without the files it includes itself. Works on
+            str and on bytes, returns (start, end) spans per file. '''
+
+        if isinstance(data, str):
+            paren_regex, closing_paren = self.paren_regex, ')'
+        else:
+            paren_regex, closing_paren = self.paren_regex_bytes, b')'
+
+        if dirname == None:
+            dirname = os.path.dirname(tex_filename)
+
+        spans = dict()
+        # one entry per open parenthesis: (file the text inside belongs to, opens a file)
+        stack = list()
+        current_filename = tex_filename
+        position = 0
+
+        for match in paren_regex.finditer(data):
+            if match.group(1) != None:
+                spans.setdefault(current_filename, list()).append((position, match.start()))
+                position = match.start()
+
+                filename = match.group(1)
+                if not isinstance(filename, str):
+                    filename = filename.decode('utf-8', errors='ignore')
+                filename = ''.join(filename.splitlines()).strip()
                 if not filename.startswith('/'):
-                    filename = path_helpers.get_abspath(filename, os.path.dirname(tex_filename))
+                    filename = path_helpers.get_abspath(filename, dirname)
                 else:
                     filename = os.path.normpath(filename)
-                if not filename == tex_filename:
-                    open_brackets = 0
-                    char_count = 0
-                    for char in match:
-                        if char == ')':
-                            open_brackets -= 1
-                        if char == '(':
-                            open_brackets += 1
-                        char_count += 1
-                        if open_brackets == 0:
-                            break
-                    match = match[:char_count]
-                    doc_texts[filename] = match
-                    log_text = log_text.replace(match, '')
-                buffer = ''
-        doc_texts[tex_filename] = log_text
-        return doc_texts
+                stack.append((filename, True))
+                current_filename = filename
+
+            elif match.group(0) != closing_paren:
+                stack.append((current_filename, False))
+
+            elif len(stack) > 0:
+                filename, is_file = stack.pop()
+                if is_file:
+                    spans.setdefault(filename, list()).append((position, match.end()))
+                    position = match.end()
+                current_filename = stack[-1][0] if len(stack) > 0 else tex_filename
+
+        spans.setdefault(current_filename, list()).append((position, len(data)))
+        spans.setdefault(tex_filename, list())
+        return spans
 
     def bl_get_line_number(self, line, matchiter):
         for i in range(10):
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os.path
+from operator import itemgetter
+
+import setzer.helpers.path as path_helpers
+from setzer.app.service_locator import ServiceLocator
+
+
+class LaTeXLogStreamParser():
+    ''' Parses interpreter output chunk by chunk while the build is running.
+        The file nesting is tracked with a stack of open parentheses,
+        items are parsed with LaTeXLogParser.parse_log_text once they are
+        complete. The log file parsed after the build stays authoritative. '''
+
+    def __init__(self, log_parser, tex_filename, dirname=None):
+        self.log_parser = log_parser
+        self.tex_filename = tex_filename
+        self.dirname = dirname if dirname != None else os.path.dirname(tex_filename)
+        self.paren_regex = ServiceLocator.get_regex_object(r'\(([^\s\(\)]*)|\)')
+        self.filename_regex = ServiceLocator.get_regex_object(r'[^\s\(\)]*')
+
+        # TeX wraps its output after this many characters
+        self.max_print_line = 79
+        # enough to find the line number of any item, see bl_get_line_number
+        self.max_item_lines = 12
+
+        self.incomplete_line = ''
+        self.incomplete_filename = None
+        self.file_stack = list()
+
+        self.item_filename = None
+        self.item_lines = list()
+
+        self.log_items = dict()
+        self.has_new_items = False
+
+    def feed(self, text):
+        lines = (self.incomplete_line + text).split('\n')
+        self.incomplete_line = lines.pop()
+
+        for line in lines:
+            if self.log_parser.item_regex.match(line + '\n'):
+                self.finish_item()
+                self.item_filename = self.get_current_filename()
+                self.item_lines.append(line + '\n')
+            elif len(self.item_lines) > 0:
+                self.item_lines.append(line + '\n')
+                if len(self.item_lines) >= self.max_item_lines:
+                    self.finish_item()
+            self.update_file_stack(line)
+
+    def finish_item(self):
+        if len(self.item_lines) == 0: return
+
+        messages = self.log_parser.parse_log_text(self.item_filename, ''.join(self.item_lines))
+        items = self.log_items.setdefault(self.item_filename, {'error': list(), 'warning': list(), 'badbox': list()})
+        for item_type, new_items in messages.items():
+            if len(new_items) > 0:
+                items[item_type] += new_items
+                self.has_new_items = True
+
+        self.item_filename = None
+        self.item_lines = list()
+
+    def update_file_stack(self, line):
+        position = 0
+        if self.incomplete_filename != None:
+            match = self.filename_regex.match(line)
+            position = match.end()
+            if not self.is_wrapped(line, position):
+                self.push_file(self.incomplete_filename + match.group(0))
+                self.incomplete_filename = None
+            else:
+                self.incomplete_filename += match.group(0)
+                return
+
+        for match in self.paren_regex.finditer(line, position):
+            if match.group(0) == ')':
+                if len(self.file_stack) > 0:
+                    self.file_stack.pop()
+            elif self.is_wrapped(line, match.end()):
+                self.incomplete_filename = match.group(1)
+            else:
+                self.push_file(match.group(1))
+
+    def is_wrapped(self, line, position):
+        return position == len(line) and len(line) == self.max_print_line
+
+    def push_file(self, filename):
+        ''' Parentheses that don't open a .tex or .gls file are kept as None,
+            their contents belong to the enclosing file. '''
+
+        if filename.endswith('.tex') or filename.endswith('.gls'):
+            if not filename.startswith('/'):
+                filename = path_helpers.get_abspath(filename, self.dirname)
+            else:
+                filename = os.path.normpath(filename)
+            self.file_stack.append(filename)
+        else:
+            self.file_stack.append(None)
+
+    def get_current_filename(self):
+        for filename in reversed(self.file_stack):
+            if filename != None:
+                return filename
+        return self.tex_filename
+
+    def get_new_log_items(self):
+        ''' Copy of all items found so far if there are new ones since the
+            last call, None otherwise. '''
+
+        if not self.has_new_items: return None
+
+        self.has_new_items = False
+        log_items = dict()
+        for filename, items in self.log_items.items():
+            log_items[filename] = {item_type: sorted(new_items, key=itemgetter(1)) for item_type, new_items in items.items()}
+        return log_items
+
+
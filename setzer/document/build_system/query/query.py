@@ -16,6 +16,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
 import _thread as thread
+import os.path
 
 
 class Query(object):
@@ -31,21 +32,45 @@ class Query(object):
         self.done_executing_lock = thread.allocate_lock()
         self.synctex_file = None
         self.synctex_file_lock = thread.allocate_lock()
+        self.timings = list()
+        self.timings_lock = thread.allocate_lock()
+        self.jobs = list()
+        self.jobs_lock = thread.allocate_lock()
 
         self.build_data = {'rerun_latex_reasons': set()}
         self.biber_data = {'ran_on_files': []}
         self.bibtex_data = {'ran_on_files': []}
         self.makeindex_data = {'ran_on_files': []}
+        self.glossaries_data = {'ran_on_files': []}
         self.can_sync = False
         self.forward_sync_data = dict()
         self.backward_sync_data = dict()
         self.tex_filename = tex_filename
+        # the file that is actually compiled, in the private build folder
+        # when building from a snapshot of the buffers
+        self.build_tex_filename = tex_filename
 
         self.log_messages = dict()
+        self.log_messages_callback = None
         self.bibtex_log_messages = {'error': list(), 'warning': list(), 'badbox': list()}
         self.force_building_to_stop = False
         self.error_count = 0
 
+    def add_jobs(self, jobs):
+        ''' Jobs to run next, none are added once the query is stopped. '''
+
+        with self.jobs_lock:
+            if not self.force_building_to_stop:
+                self.jobs[0:0] = jobs
+
+    def stop(self):
+        ''' Jobs already running finish, but don't schedule new ones or
+            write their results. '''
+
+        with self.jobs_lock:
+            self.force_building_to_stop = True
+            self.jobs = list()
+
     def get_build_result(self):
         return_value = None
         with self.build_result_lock:
@@ -67,6 +92,26 @@ class Query(object):
                 return_value = self.backward_sync_result
         return return_value
 
+    def add_timing(self, job, seconds, step=None):
+        ''' Time spent in a job, or in a step of it. LaTeX passes are
+            numbered, auxiliary jobs can add timings from other threads. '''
+
+        latex_pass = self.build_data.get('latex_pass') if job == 'build_latex' else None
+        with self.timings_lock:
+            self.timings.append({'job': job, 'pass': latex_pass, 'step': step, 'seconds': seconds})
+
+    def get_timings(self):
+        with self.timings_lock:
+            return list(self.timings)
+
+    def get_source_filename(self, filename):
+        ''' Maps a file in the build folder back to the document folder. '''
+
+        build_folder = os.path.dirname(self.build_tex_filename)
+        if build_folder != os.path.dirname(self.tex_filename) and filename.startswith(build_folder + '/'):
+            return os.path.join(os.path.dirname(self.tex_filename), filename[len(build_folder) + 1:])
+        return filename
+
     def mark_done(self):
         with self.done_executing_lock:
             self.done_executing = True
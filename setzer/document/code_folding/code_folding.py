@@ -47,7 +47,7 @@ class CodeFolding(Observable):
 
         self.document.content.connect('text_inserted', self.on_text_inserted)
         self.document.content.connect('text_deleted', self.on_text_deleted)
-        self.document.content.connect('buffer_changed', self.on_buffer_changed)
+        self.document.connect('symbols_updated', self.on_symbols_updated)
 
     def on_text_inserted(self, content, parameter):
         buffer, location_iter, text, text_length = parameter
@@ -80,7 +80,7 @@ class CodeFolding(Observable):
                 marks_start[index2] = region_id
         self.marks_start = marks_start
 
-    def on_buffer_changed(self, content, parameter):
+    def on_symbols_updated(self, document):
         if self.is_enabled:
             self.update_folding_regions()
 
@@ -112,7 +112,7 @@ class CodeFolding(Observable):
     def get_folding_region_by_region_id(self, region_id):
         return self.folding_regions_by_region_id[region_id]
 
-    #@timer
+    @timer
     def update_folding_regions(self):
         folding_regions = dict()
         folding_regions_by_region_id = dict()
@@ -150,7 +150,7 @@ class CodeFolding(Observable):
         if not self.initial_folding_done:
             self.initial_folding()
 
-    #@timer
+    @timer
     def delete_invalid_regions(self, folding_regions_by_region_id):
         regions_to_delete = [region_id for region_id in self.folding_regions_by_region_id if region_id not in folding_regions_by_region_id]
         for region_id in regions_to_delete:
@@ -172,7 +172,7 @@ class CodeFolding(Observable):
             return self.marks_start[offset]
         return None
 
-    #@timer
+    @timer
     def blocks_changed(self, blocks):
         blocks_old = self.blocks
         if len(blocks) != len(blocks_old):
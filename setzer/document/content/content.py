@@ -621,9 +621,9 @@ class Content(Observable):
         if package_data:
             max_end = 0
             for package in package_data.values():
-                offset, match_obj = package
+                offset, length = package
                 if offset > max_end:
-                    max_end = offset + match_obj.end() - match_obj.start()
+                    max_end = offset + length
             insert_iter = self.source_buffer.get_iter_at_offset(max_end)
             if not insert_iter.ends_line():
                 insert_iter.forward_to_line_end()
@@ -643,12 +643,13 @@ class Content(Observable):
         packages_dict = self.document.get_package_details()
         for package in packages:
             try:
-                offset, match_obj = packages_dict[package]
+                offset, length = packages_dict[package]
             except KeyError: return
             start_iter = self.source_buffer.get_iter_at_offset(offset)
-            end_iter = self.source_buffer.get_iter_at_offset(offset + match_obj.end() - match_obj.start())
+            end_iter = self.source_buffer.get_iter_at_offset(offset + length)
             text = self.source_buffer.get_text(start_iter, end_iter, False)
-            if text == match_obj.group(0):  
+            match = ServiceLocator.get_regex_object(r'\\usepackage(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}').fullmatch(text)
+            if match != None and match.group(1).strip() == package:
                 if start_iter.get_line_offset() == 0:
                     start_iter.backward_char()
                 self.source_buffer.delete(start_iter, end_iter)
@@ -59,6 +59,7 @@ class Document(Observable):
         self.symbols['packages'] = set()
         self.symbols['packages_detailed'] = dict()
         self.symbols['blocks'] = list()
+        self.symbols['begin_document_offset'] = None
 
     def init_default_modules(self):
         self.view = document_view.DocumentView(self)
@@ -165,36 +166,50 @@ class Document(Observable):
         return self.is_root
 
     def get_bibitems(self):
+        self.parser.flush()
         return self.symbols['bibitems']
 
     def get_packages(self):
+        self.parser.flush()
         return self.symbols['packages']
 
     def get_package_details(self):
+        self.parser.flush()
         return self.symbols['packages_detailed']
 
     def get_blocks(self):
+        self.parser.flush()
         return self.symbols['blocks']
 
     def set_blocks(self, blocks):
         self.symbols['blocks'] = blocks
 
     def get_included_latex_files(self):
+        self.parser.flush()
         return self.symbols['included_latex_files']
 
+    def get_begin_document_offset(self):
+        self.parser.flush()
+        return self.symbols['begin_document_offset']
+
     def get_bibliography_files(self):
+        self.parser.flush()
         return self.symbols['bibliographies']
 
     def get_labels(self):
+        self.parser.flush()
         return self.symbols['labels']
 
     def get_labels_with_offset(self):
+        self.parser.flush()
         return self.symbols['labels_with_offset']
 
     def get_todos(self):
+        self.parser.flush()
         return self.symbols['todos']
 
     def get_todos_with_offset(self):
+        self.parser.flush()
         return self.symbols['todos_with_offset']
 
 
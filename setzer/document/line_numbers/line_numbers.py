@@ -77,7 +77,7 @@ class LineNumbers(object):
     def on_pointer_movement(self, event):
         pass
 
-    #@timer
+    @timer
     def on_draw(self, gutter, drawing_area, ctx, lines, current_line, offset):
         self.layout.set_font_description(self.font_desc)
         self.layout.set_width((self.size - self.char_width) * Pango.SCALE)
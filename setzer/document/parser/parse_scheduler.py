@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+
+class ParseScheduler(object):
+    ''' Collects the lines touched by buffer edits and runs a single
+        parse pass for all of them once the main loop is idle. '''
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.dirty_ranges = list()
+        self.is_pending = False
+        self.source_id = None
+
+    def add_dirty_lines(self, line_start, line_end, line_delta):
+        ''' Lines line_start to line_end (before the edit) were replaced,
+            the lines after them moved by line_delta. '''
+
+        def move_line(line):
+            if line <= line_start: return line
+            elif line <= line_end: return line_start
+            else: return line + line_delta
+
+        dirty_ranges = [[move_line(start), move_line(end)] for (start, end) in self.dirty_ranges]
+        dirty_ranges.append([line_start, line_end + line_delta])
+        dirty_ranges.sort()
+
+        self.dirty_ranges = list()
+        for dirty_range in dirty_ranges:
+            if len(self.dirty_ranges) > 0 and dirty_range[0] <= self.dirty_ranges[-1][1] + 1:
+                self.dirty_ranges[-1][1] = max(self.dirty_ranges[-1][1], dirty_range[1])
+            else:
+                self.dirty_ranges.append(dirty_range)
+
+        self.schedule()
+
+    def schedule(self):
+        self.is_pending = True
+        if self.source_id == None:
+            self.source_id = GLib.idle_add(self.on_idle, priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def cancel(self):
+        if self.source_id != None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        self.dirty_ranges = list()
+        self.is_pending = False
+
+    def on_idle(self):
+        self.source_id = None
+        self.flush()
+        return False
+
+    def flush(self):
+        if self.source_id != None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        if not self.is_pending: return
+
+        dirty_ranges = self.dirty_ranges
+        self.dirty_ranges = list()
+        self.is_pending = False
+        self.callback(dirty_ranges)
+
+
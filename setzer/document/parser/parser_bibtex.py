@@ -17,6 +17,7 @@
 
 import bibtexparser
 
+import setzer.document.parser.parse_scheduler as parse_scheduler
 from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.timer import timer
 
@@ -26,21 +27,29 @@ class ParserBibTeX(object):
     def __init__(self, document):
         self.document = document
         self.text = ''
+        self.parse_scheduler = parse_scheduler.ParseScheduler(self.on_parse_scheduled)
 
-    #@timer
+    @timer
     def on_text_deleted(self, buffer, start_iter, end_iter):
         start_offset = start_iter.get_offset()
         end_offset = end_iter.get_offset()
         self.text = self.text[:start_offset] + self.text[end_offset:]
-        self.parse_symbols(self.text)
+        self.parse_scheduler.schedule()
 
-    #@timer
+    @timer
     def on_text_inserted(self, buffer, location_iter, text, text_length):
         offset = location_iter.get_offset()
         self.text = self.text[:offset] + text + self.text[offset:]
+        self.parse_scheduler.schedule()
+
+    def flush(self):
+        self.parse_scheduler.flush()
+
+    def on_parse_scheduled(self, dirty_ranges):
         self.parse_symbols(self.text)
+        self.document.add_change_code('symbols_updated')
 
-    #@timer
+    @timer
     def parse_symbols(self, text):
         db = bibtexparser.loads(text)
         bibitems = set()
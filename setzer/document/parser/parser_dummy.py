@@ -27,4 +27,7 @@ class ParserDummy(object):
     def on_text_inserted(self, buffer, location_iter, text, text_length):
         pass
 
+    def flush(self):
+        pass
+
 
@@ -15,6 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import gi
+from gi.repository import GLib
+import _thread as thread
+import os
+import sys
+
+import setzer.document.parser.symbol_list as symbol_list
+import setzer.document.parser.symbol as symbol
+import setzer.document.parser.parse_scheduler as parse_scheduler
 from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.timer import timer
 
@@ -23,13 +32,47 @@ class ParserLaTeX(object):
 
     def __init__(self, document):
         self.document = document
+        self.buffer = None
         self.text_length = 0
         self.number_of_lines = 0
-        self.block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        self.other_symbols = list()
-
-    #@timer
+        self.block_symbol_matches = {'begin_or_end': symbol_list.SymbolList(), 'others': symbol_list.SymbolList()}
+        self.other_symbols = symbol_list.SymbolList(has_lines=False)
+
+        # persistent state for incremental updates
+        self.environment_symbols = dict()
+        # stack depth before each begin / end symbol, end symbol of each begin symbol
+        self.environment_depths = dict()
+        self.environment_partners = dict()
+        self.section_levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4, 'paragraph': 5, 'subparagraph': 6}
+        self.section_symbols = [symbol_list.SymbolList() for level in range(7)]
+        self.block_list = symbol_list.BlockList()
+        self.symbol_counts = {'labels': dict(), 'todos': dict(), 'bibliographies': dict(), 'bibitems': dict(), 'packages': dict()}
+        self.changed_symbol_sets = set()
+        # other symbols that are also published with their offsets
+        self.symbol_list_keys = {'label': 'labels_with_offset', 'todo': 'todos_with_offset', 'include': 'included_latex_files', 'input': 'included_latex_files', 'subfile': 'included_latex_files', 'subimport': 'included_latex_files', 'usepackage': 'packages_detailed'}
+        self.symbol_lists = dict()
+        for key in self.symbol_list_keys.values():
+            self.symbol_lists[key] = symbol_list.SymbolList(has_lines=False)
+        # blocks and symbol lists with offsets are built when they're read
+        self.blocks_outdated = False
+        self.outdated_symbol_lists = set()
+        self.reset_changes()
+
+        # edits only invalidate lines, parsing happens once per batch
+        self.parse_scheduler = parse_scheduler.ParseScheduler(self.parse_dirty_lines)
+
+        # large texts inserted into an empty buffer are parsed in a
+        # worker thread, edits are only counted until its snapshot arrived
+        self.background_parse_min_length = 100000
+        self.background_parse_running = False
+        self.text_version = 0
+
+        # compare every incremental update against a full recompute
+        self.check_incremental_updates = (os.environ.get('SETZER_CHECK_PARSER') == '1')
+
+    @timer
     def on_text_deleted(self, buffer, start_iter, end_iter):
+        self.buffer = buffer
         offset_start = start_iter.get_offset()
         offset_end = end_iter.get_offset()
         line_start = start_iter.get_line()
@@ -41,55 +84,21 @@ class ParserLaTeX(object):
             after_iter.backward_char()
 
         text_length = offset_end - offset_start
-        text = buffer.get_text(start_iter, end_iter, True)
-        deleted_line_count = text.count('\n')
-        text_before = buffer.get_text(before_iter, start_iter, True)
-        text_after = buffer.get_text(end_iter, after_iter, True)
+        deleted_line_count = line_end - line_start
         offset_line_start = before_iter.get_offset()
+        offset_line_end = after_iter.get_offset()
         self.text_length = char_count - offset_end + offset_start
-
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
-
-        offset_line_end = offset_end + len(text_after)
-        text = text_before + text_after
-
-        additional_matches = self.parse_for_blocks(text, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text):
-            other_symbols.append((match, match.start() + offset_line_start))
-
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_end:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_end:
-                block_symbol_matches['others'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] - text_length))
-
-        self.block_symbol_matches = block_symbol_matches
         self.number_of_lines = self.number_of_lines - deleted_line_count
-        self.parse_blocks()
+        self.text_version += 1
+        if self.background_parse_running: return
 
-        self.other_symbols = other_symbols
-        self.parse_symbols()
+        self.invalidate_lines(line_start, line_end, offset_line_start, offset_line_end, -deleted_line_count, -text_length)
+        self.parse_scheduler.add_dirty_lines(line_start, line_end, -deleted_line_count)
 
-    #@timer
+    @timer
     def on_text_inserted(self, buffer, location_iter, text, text_length):
+        self.buffer = buffer
         text_length = len(text)
-        offset = location_iter.get_offset()
         new_line_count = text.count('\n')
         line_start = location_iter.get_line()
         char_count = buffer.get_char_count()
@@ -98,64 +107,398 @@ class ParserLaTeX(object):
         if not after_iter.get_offset() == char_count:
             after_iter.backward_char()
 
-        text_before = buffer.get_text(before_iter, location_iter, True)
         offset_line_start = before_iter.get_offset()
-        text_after = buffer.get_text(location_iter, after_iter, True)
-        offset_line_end = offset + len(text_after)
+        offset_line_end = after_iter.get_offset()
         self.text_length = char_count + text_length
-        text_parse = text_before + text + text_after
-
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
-
-        additional_matches = self.parse_for_blocks(text_parse, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text_parse):
-            other_symbols.append((match, match.start() + offset_line_start))
-
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_start:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_start:
-                block_symbol_matches['others'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] + text_length))
-
-        self.block_symbol_matches = block_symbol_matches
         self.number_of_lines = self.number_of_lines + new_line_count
-        self.parse_blocks()
+        self.text_version += 1
+        if self.background_parse_running: return
+        if char_count == 0 and text_length >= self.background_parse_min_length:
+            self.start_background_parse(text)
+            return
+
+        self.invalidate_lines(line_start, line_start, offset_line_start, offset_line_end, new_line_count, text_length)
+        self.parse_scheduler.add_dirty_lines(line_start, line_start, new_line_count)
+
+    def flush(self):
+        ''' Parse pending changes right away, for callers that need
+            up-to-date symbols before the scheduled pass ran. While a
+            background parse is running the old symbols are kept. '''
+
+        self.parse_scheduler.flush()
+        self.update_derived_symbols()
+
+    def start_background_parse(self, text):
+        self.background_parse_running = True
+        self.parse_scheduler.cancel()
+        thread.start_new_thread(self.background_parse, (text, self.text_version))
+
+    @timer
+    def background_parse(self, text, text_version):
+        ''' Runs in a worker thread. Only reads text, the result is an
+            immutable snapshot handed back to the main loop. '''
+
+        block_symbol_matches = self.parse_for_blocks(text, 0, 0)
+        other_symbols = self.parse_for_other_symbols(text, 0)
+
+        environment_symbols = dict()
+        for entry in block_symbol_matches['begin_or_end']:
+            try: environment_symbols[entry[0].name].append(entry)
+            except KeyError: environment_symbols[entry[0].name] = [entry]
+        section_symbols = [list() for level in range(7)]
+        for entry in block_symbol_matches['others']:
+            section_symbols[self.section_levels[entry[0].kind]].append(entry)
+        symbol_lists = self.split_other_symbols(other_symbols)
+
+        snapshot = dict()
+        snapshot['begin_or_end'] = tuple(block_symbol_matches['begin_or_end'])
+        snapshot['others'] = tuple(block_symbol_matches['others'])
+        snapshot['other_symbols'] = tuple(other_symbols)
+        snapshot['environments'] = tuple((name, tuple(entries)) for name, entries in environment_symbols.items())
+        snapshot['sections'] = tuple(tuple(entries) for entries in section_symbols)
+        snapshot['symbol_lists'] = tuple((key, tuple(entries)) for key, entries in symbol_lists.items())
+        GLib.idle_add(self.apply_background_parse, snapshot, text_version)
+
+    @timer
+    def apply_background_parse(self, snapshot, text_version):
+        ''' Install a snapshot from background_parse(). If the text was
+            edited in the meantime the snapshot is outdated and the
+            current text gets parsed again. '''
+
+        if text_version != self.text_version:
+            text = self.buffer.get_text(self.buffer.get_start_iter(), self.buffer.get_end_iter(), True)
+            thread.start_new_thread(self.background_parse, (text, self.text_version))
+            return False
+        self.background_parse_running = False
+
+        for kind in ['begin_or_end', 'others']:
+            removed = list(self.block_symbol_matches[kind])
+            self.block_symbol_matches[kind].set_entries(snapshot[kind])
+            self.add_changes(kind, removed, snapshot[kind])
+        removed = list(self.other_symbols)
+        self.other_symbols.set_entries(snapshot['other_symbols'])
+        self.add_changes('other_symbols', removed, snapshot['other_symbols'])
+
+        self.changes['environments'].update(self.environment_symbols)
+        self.environment_symbols = dict()
+        for name, entries in snapshot['environments']:
+            self.environment_symbols[name] = symbol_list.SymbolList()
+            self.environment_symbols[name].set_entries(entries)
+            self.changes['environments'].add(name)
+        for level, entries in enumerate(snapshot['sections']):
+            self.section_symbols[level].set_entries(entries)
+        for key, entries in snapshot['symbol_lists']:
+            self.symbol_lists[key].set_entries(entries)
+            self.outdated_symbol_lists.add(key)
+
+        self.publish_changes()
+        return False
+
+    def reset_changes(self):
+        self.changes = {'begin_or_end': ([], []), 'others': ([], []), 'other_symbols': ([], []), 'environments': set()}
+
+    def add_changes(self, kind, removed, added):
+        self.changes[kind][0].extend(removed)
+        self.changes[kind][1].extend(added)
+
+    @timer
+    def invalidate_lines(self, line_start, line_end, offset_line_start, offset_line_end, line_delta, offset_delta):
+        ''' Drop the symbols on the edited lines and shift the ones after
+            them. The dropped lines are parsed again by parse_dirty_lines(). '''
+
+        self.replace_lines(line_start, line_end, offset_line_start, offset_line_end, '', line_delta, offset_delta)
+
+    @timer
+    def parse_dirty_lines(self, dirty_ranges):
+        if self.buffer == None: return
+
+        char_count = self.buffer.get_char_count()
+        for (line_start, line_end) in dirty_ranges:
+            start_iter = self.buffer.get_iter_at_line(line_start)
+            end_iter = self.buffer.get_iter_at_line(line_end + 1)
+            if not end_iter.get_offset() == char_count:
+                end_iter.backward_char()
+            text = self.buffer.get_text(start_iter, end_iter, True)
+            self.replace_lines(line_start, line_end, start_iter.get_offset(), end_iter.get_offset(), text, 0, 0)
+
+        self.publish_changes(dirty_ranges)
+
+    def publish_changes(self, dirty_ranges=None):
+        ''' dirty_ranges are the lines parsed again since the last call,
+            None if all symbols were replaced. '''
+
+        self.update_blocks(dirty_ranges)
+        self.update_symbol_counts(*self.changes['other_symbols'])
+        self.update_symbols()
+        self.reset_changes()
+        self.blocks_outdated = True
+
+        if self.check_incremental_updates:
+            self.check_against_full_recompute()
+
+        self.document.add_change_code('symbols_updated')
+
+    def replace_lines(self, line_start, line_end, offset_line_start, offset_line_end, text, line_delta, offset_delta):
+        ''' Replace the symbols on lines line_start to line_end with the ones
+            found in text and shift the following symbols. '''
 
-        self.other_symbols = other_symbols
-        self.parse_symbols()
-
-    #@timer
+        additional_matches = self.parse_for_blocks(text, line_start, offset_line_start)
+        additional_symbols = self.parse_for_other_symbols(text, offset_line_start)
+        for kind in ['begin_or_end', 'others']:
+            removed = self.block_symbol_matches[kind].replace(line_start, line_end, additional_matches[kind], line_delta, offset_delta)
+            self.add_changes(kind, removed, additional_matches[kind])
+        removed = self.other_symbols.replace(offset_line_start, offset_line_end, additional_symbols, 0, offset_delta)
+        self.add_changes('other_symbols', removed, additional_symbols)
+
+        self.replace_environment_symbols(line_start, line_end, additional_matches['begin_or_end'], line_delta, offset_delta)
+        self.replace_section_symbols(line_start, line_end, additional_matches['others'], line_delta, offset_delta)
+        self.replace_symbol_lists(offset_line_start, offset_line_end, additional_symbols, offset_delta)
+        self.block_list.replace(line_start, line_end, [], line_delta, offset_delta)
+
+    @timer
     def parse_for_blocks(self, text, line_start, offset_line_start):
         block_symbol_matches = {'begin_or_end': list(), 'others': list()}
         counter = line_start
         for match in ServiceLocator.get_regex_object(r'\n|\\(begin|end)\{((?:\w|•|\*)+)\}|\\(part|chapter|section|subsection|subsubsection|paragraph|subparagraph)(?:\*){0,1}\{([^\{]*)\}').finditer(text):
             if match.group(1) != None:
-                block_symbol_matches['begin_or_end'].append((match, counter, match.start() + offset_line_start))
+                block_symbol = symbol.Symbol(match.group(1), match.group(2), match.end() - match.start())
+                block_symbol_matches['begin_or_end'].append((block_symbol, counter, match.start() + offset_line_start))
             elif match.group(3) != None:
-                block_symbol_matches['others'].append((match, counter, match.start() + offset_line_start))
+                block_symbol = symbol.Symbol(match.group(3), match.group(4), match.end() - match.start())
+                block_symbol_matches['others'].append((block_symbol, counter, match.start() + offset_line_start))
                 counter += len(match.group(0).splitlines()) - 1
             if match.group(0) == '\n':
                 counter += 1
         return block_symbol_matches
 
-    #@timer
-    def parse_blocks(self):
+    @timer
+    def parse_for_other_symbols(self, text, offset_line_start):
+        other_symbols = list()
+        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text):
+            if match.group(1) != None:
+                other_symbol = symbol.Symbol(match.group(1), match.group(2).strip(), match.end() - match.start())
+            elif match.group(3) != None:
+                other_symbol = symbol.Symbol(match.group(3), match.group(4).strip(), match.end() - match.start())
+            else:
+                other_symbol = symbol.Symbol(match.group(5), match.group(6).strip(), match.end() - match.start())
+            other_symbols.append((other_symbol, match.start() + offset_line_start))
+        return other_symbols
+
+    @timer
+    def replace_environment_symbols(self, line_start, line_end, added, line_delta, offset_delta):
+        ''' Keep one symbol list per environment name, so only the names
+            touched by an edit have to be paired again. '''
+
+        added_by_name = dict()
+        for entry in added:
+            try: added_by_name[entry[0].name].append(entry)
+            except KeyError: added_by_name[entry[0].name] = [entry]
+
+        for name in added_by_name:
+            if name not in self.environment_symbols:
+                self.environment_symbols[name] = symbol_list.SymbolList()
+
+        for name, symbols in list(self.environment_symbols.items()):
+            entries = added_by_name.get(name, list())
+            removed = symbols.replace(line_start, line_end, entries, line_delta, offset_delta)
+            if len(removed) > 0 or len(entries) > 0:
+                self.changes['environments'].add(name)
+            for (block_symbol, line_number, offset) in removed:
+                self.environment_depths.pop(block_symbol, None)
+                self.environment_partners.pop(block_symbol, None)
+            if len(symbols) == 0:
+                del(self.environment_symbols[name])
+
+    @timer
+    def replace_section_symbols(self, line_start, line_end, added, line_delta, offset_delta):
+        ''' One symbol list per level, to find the section ending
+            another one without walking through all sections. '''
+
+        added_by_level = [list() for level in range(7)]
+        for entry in added:
+            added_by_level[self.section_levels[entry[0].kind]].append(entry)
+
+        for level, symbols in enumerate(self.section_symbols):
+            symbols.replace(line_start, line_end, added_by_level[level], line_delta, offset_delta)
+
+    def split_other_symbols(self, other_symbols):
+        symbol_lists = dict()
+        for key in self.symbol_lists:
+            symbol_lists[key] = list()
+        for entry in other_symbols:
+            key = self.symbol_list_keys.get(entry[0].kind)
+            if key != None:
+                symbol_lists[key].append(entry)
+        return symbol_lists
+
+    @timer
+    def replace_symbol_lists(self, offset_start, offset_end, added, offset_delta):
+        ''' A list only has to be built again if one of its symbols
+            changed or moved. '''
+
+        added_by_key = self.split_other_symbols(added)
+        for key, symbols in self.symbol_lists.items():
+            entries = added_by_key[key]
+            removed = symbols.replace(offset_start, offset_end, entries, 0, offset_delta)
+            if len(removed) > 0 or len(entries) > 0 or (offset_delta != 0 and symbols.gap < len(symbols)):
+                self.outdated_symbol_lists.add(key)
+
+    @timer
+    def update_blocks(self, dirty_ranges):
+        ''' Pair environments and find the ends of sections again around
+            the dirty lines only and splice the resulting blocks into the
+            block list. Blocks enclosing the dirty lines get their new end. '''
+
+        if dirty_ranges == None:
+            self.environment_depths = dict()
+            self.environment_partners = dict()
+            self.block_list.begin_bulk_update()
+            for name in self.environment_symbols:
+                self.pair_environment_symbols(name, 0, sys.maxsize)
+            self.update_section_blocks(0, sys.maxsize)
+            self.block_list.end_bulk_update()
+            return
+
+        for (line_start, line_end) in dirty_ranges:
+            for name in self.environment_symbols:
+                if name in self.changes['environments']:
+                    self.pair_environment_symbols(name, line_start, line_end)
+                else:
+                    self.update_enclosing_environment_blocks(name, line_start)
+            self.update_section_blocks(line_start, line_end)
+
+    def pair_environment_symbols(self, name, line_start, line_end):
+        ''' Pair the symbols of one environment on lines line_start to
+            line_end again, from the last symbol before them where no
+            environment of this name is open, up to the first one after
+            them where none is open, both before and after the edit. '''
+
+        symbols = self.environment_symbols[name]
+        index_start = symbols.bisect_left(line_start)
+        index_end = symbols.bisect_right(line_end)
+        while index_start > 0 and self.get_depth_after(symbols[index_start - 1][0]) != 0:
+            index_start -= 1
+
+        open_blocks = list()
+        unpaired_blocks = dict()
+        for index in range(index_start, len(symbols)):
+            block_symbol, line_number, offset = symbols[index]
+            if index >= index_end and len(open_blocks) == 0 and self.environment_depths.get(block_symbol) == 0: break
+
+            self.environment_depths[block_symbol] = len(open_blocks)
+            if block_symbol.kind == 'begin':
+                if self.environment_partners.pop(block_symbol, None) != None:
+                    unpaired_blocks[block_symbol] = (line_number, offset)
+                open_blocks.append((block_symbol, line_number, offset))
+            elif len(open_blocks) > 0:
+                begin_symbol, begin_line, begin_offset = open_blocks.pop()
+                self.environment_partners[begin_symbol] = block_symbol
+                unpaired_blocks.pop(begin_symbol, None)
+                self.block_list.set_block(begin_line, begin_offset, line_number, offset, (name,))
+
+        for (line_number, offset) in unpaired_blocks.values():
+            self.block_list.remove_block(line_number, offset)
+
+    def update_enclosing_environment_blocks(self, name, line_start):
+        ''' The pairs of an environment didn't change, but the ones open
+            at line_start may have ended after an edit. Their begin
+            symbols weren't shifted, so their ends are set again. '''
+
+        symbols = self.environment_symbols[name]
+        index_start = symbols.bisect_left(line_start)
+        if index_start == len(symbols): return
+        depth = self.environment_depths.get(symbols[index_start][0])
+        if not depth: return
+
+        blocks_by_end_symbol = dict()
+        for index in range(index_start - 1, -1, -1):
+            block_symbol, line_number, offset = symbols[index]
+            if block_symbol.kind == 'begin' and self.environment_depths.get(block_symbol) == depth - 1:
+                end_symbol = self.environment_partners.get(block_symbol)
+                if end_symbol != None:
+                    blocks_by_end_symbol[end_symbol] = (line_number, offset)
+                depth -= 1
+                if depth == 0: break
+
+        for index in range(index_start, len(symbols)):
+            if len(blocks_by_end_symbol) == 0: break
+            block_symbol, line_number, offset = symbols[index]
+            if block_symbol in blocks_by_end_symbol:
+                begin_line, begin_offset = blocks_by_end_symbol.pop(block_symbol)
+                self.block_list.set_block(begin_line, begin_offset, line_number, offset, (name,))
+
+    def get_depth_after(self, block_symbol):
+        depth = self.environment_depths.get(block_symbol)
+        if depth == None: return None
+        if block_symbol.kind == 'begin': return depth + 1
+        return max(depth - 1, 0)
+
+    def get_document_symbols(self):
+        begin_document = None
+        end_document = None
+        if 'document' in self.environment_symbols:
+            for (block_symbol, line_number, offset) in self.environment_symbols['document']:
+                if block_symbol.kind == 'begin':
+                    begin_document = (line_number, offset)
+                else:
+                    end_document = (line_number, offset)
+        return (begin_document, end_document)
+
+    @timer
+    def update_section_blocks(self, line_start, line_end):
+        ''' A section ends at the next one of the same or a higher level,
+            paragraphs and subparagraphs only at \\end{document} or the end
+            of the text. Only the sections on the dirty lines and the last
+            one of each level before them can have a new end. '''
+
+        for level, symbols in enumerate(self.section_symbols):
+            index_start = symbols.bisect_left(line_start)
+            index_end = symbols.bisect_right(line_end)
+            if level <= 4 and index_start > 0:
+                index_start -= 1
+            for index in range(index_start, index_end):
+                block_symbol, line_number, offset = symbols[index]
+                end = None
+                if level <= 4:
+                    for end_level in range(level + 1):
+                        following_section = self.get_following_section(end_level, line_number, offset)
+                        if following_section != None and (end == None or following_section[2] < end[2]):
+                            end = following_section
+                if end != None:
+                    # - 1 to go one line up
+                    self.block_list.set_block(line_number, offset, end[1] - 1, end[2] - 1, (block_symbol.kind, block_symbol.name))
+                else:
+                    self.block_list.set_block(line_number, offset, None, None, (block_symbol.kind, block_symbol.name))
+
+    def get_following_section(self, level, line_number, offset):
+        symbols = self.section_symbols[level]
+        index = symbols.bisect_left(line_number)
+        while index < len(symbols) and symbols[index][2] <= offset:
+            index += 1
+        return symbols[index] if index < len(symbols) else None
+
+    @timer
+    def get_blocks_from_list(self):
+        ''' Sections ending at \\end{document} or the end of the text get
+            their end here, it moves with every edit. '''
+
+        begin_document, end_document = self.get_document_symbols()
+
+        blocks_list = list()
+        add_preamble_folding = True
+        for symbols in self.block_symbol_matches.values():
+            if len(symbols) > 0 and symbols[0][1] == 0:
+                add_preamble_folding = False
+        if add_preamble_folding and begin_document != None and begin_document[1] and begin_document[0]:
+            blocks_list.append([0, begin_document[1] - 1, 0, begin_document[0] - 1, 'preamble'])
+
+        blocks_list.extend(self.block_list.get_blocks(end_document, (self.number_of_lines, self.text_length)))
+        return blocks_list
+
+    @timer
+    def compute_blocks(self):
+        ''' Full recompute, used to check the incremental updates. '''
+
         blocks = dict()
 
         add_preamble_folding = True
@@ -164,21 +507,21 @@ class ParserLaTeX(object):
         begin_document_offset = None
         begin_document_line = None
         blocks_list = list()
-        for (match, line_number, offset) in self.block_symbol_matches['begin_or_end']:
+        for (block_symbol, line_number, offset) in self.block_symbol_matches['begin_or_end']:
             if line_number == 0:
                 add_preamble_folding = False
 
-            if match.group(1) == 'begin':
-                if match.group(2).strip() == 'document':
+            if block_symbol.kind == 'begin':
+                if block_symbol.name == 'document':
                     begin_document_offset = offset
                     begin_document_line = line_number
-                try: blocks[match.group(2)].append([offset, None, line_number, None])
-                except KeyError: blocks[match.group(2)] = [[offset, None, line_number, None]]
+                try: blocks[block_symbol.name].append([offset, None, line_number, None])
+                except KeyError: blocks[block_symbol.name] = [[offset, None, line_number, None]]
             else:
-                if match.group(2).strip() == 'document':
+                if block_symbol.name == 'document':
                     end_document_offset = offset
                     end_document_line = line_number
-                try: blocks_begin = blocks[match.group(2)]
+                try: blocks_begin = blocks[block_symbol.name]
                 except KeyError: pass
                 else:
                     try: block_begin = blocks_begin.pop()
@@ -186,16 +529,16 @@ class ParserLaTeX(object):
                     else:
                         block_begin[1] = offset
                         block_begin[3] = line_number
-                        block_begin.append(match.group(2))
+                        block_begin.append(block_symbol.name)
                         blocks_list.append(block_begin)
 
         relevant_following_blocks = [list(), list(), list(), list(), list(), list(), list()]
         levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4, 'paragraph': 5, 'subparagraph': 6}
-        for (match, line_number, offset) in reversed(self.block_symbol_matches['others']):
+        for (block_symbol, line_number, offset) in reversed(self.block_symbol_matches['others']):
             if line_number == 0:
                 add_preamble_folding = False
 
-            level = levels[match.group(3)]
+            level = levels[block_symbol.kind]
             block = [offset, None, line_number, None]
 
             if len(relevant_following_blocks[level]) >= 1:
@@ -211,8 +554,8 @@ class ParserLaTeX(object):
                     block[1] = self.text_length
                     block[3] = self.number_of_lines
 
-            block.append(match.group(3))
-            block.append(match.group(4))
+            block.append(block_symbol.kind)
+            block.append(block_symbol.name)
             blocks_list.append(block)
             for i in range(level, 5):
                 relevant_following_blocks[i].append(block)
@@ -220,10 +563,12 @@ class ParserLaTeX(object):
         if add_preamble_folding and begin_document_offset and begin_document_line:
             blocks_list.append([0, begin_document_offset - 1, 0, begin_document_line - 1, 'preamble'])
 
-        self.document.set_blocks(sorted(blocks_list, key=lambda block: block[0]))
+        return sorted(blocks_list, key=lambda block: block[0])
+
+    @timer
+    def compute_symbols(self):
+        ''' Full recompute, used to check the incremental updates. '''
 
-    #@timer
-    def parse_symbols(self):
         labels = set()
         labels_with_offset = list()
         todos = set()
@@ -233,42 +578,134 @@ class ParserLaTeX(object):
         bibitems = set()
         packages = set()
         packages_detailed = dict()
-        for match in self.other_symbols:
-            offset = match[1]
-            match = match[0]
-            if match.group(1) == 'label':
-                labels = labels | {match.group(2).strip()}
-                labels_with_offset.append([match.group(2).strip(), offset])
-            elif match.group(1) == 'include' or match.group(1) == 'input' or match.group(1) == 'subfile' or match.group(1) == 'subimport':
-                filename = match.group(2).strip()
+        for (other_symbol, offset) in self.other_symbols:
+            kind = other_symbol.kind
+            if kind == 'label':
+                labels.add(other_symbol.name)
+                labels_with_offset.append([other_symbol.name, offset])
+            elif kind == 'include' or kind == 'input' or kind == 'subfile' or kind == 'subimport':
+                filename = other_symbol.name
                 if not filename.endswith('.tex'):
                     filename += '.tex'
                 included_latex_files.append((filename, offset))
-            elif match.group(1) == 'bibliography':
-                bibfiles = match.group(2).strip().split(',')
+            elif kind == 'bibliography':
+                bibfiles = other_symbol.name.split(',')
                 for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip() + '.bib'}
-            elif match.group(1) == 'addbibresource':
-                bibfiles = match.group(2).strip().split(',')
+                    bibliographies.add(entry.strip() + '.bib')
+            elif kind == 'addbibresource':
+                bibfiles = other_symbol.name.split(',')
                 for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip()}
-            elif match.group(1) == 'todo':
-                todos = todos | {match.group(2).strip()}
-                todos_with_offset.append([match.group(2).strip(), offset])
-            elif match.group(3) == 'usepackage':
-                packages = packages | {match.group(4).strip()}
-                packages_detailed[match.group(4).strip()] = [offset, match]
-            elif match.group(5) == 'bibitem':
-                bibitems = bibitems | {match.group(6).strip()}
-
-        self.document.symbols['labels'] = labels
-        self.document.symbols['labels_with_offset'] = labels_with_offset
-        self.document.symbols['included_latex_files'] = included_latex_files
-        self.document.symbols['todos'] = todos
-        self.document.symbols['todos_with_offset'] = todos_with_offset
-        self.document.symbols['bibliographies'] = bibliographies
-        self.document.symbols['bibitems'] = bibitems
-        self.document.symbols['packages'] = packages
-        self.document.symbols['packages_detailed'] = packages_detailed
+                    bibliographies.add(entry.strip())
+            elif kind == 'todo':
+                todos.add(other_symbol.name)
+                todos_with_offset.append([other_symbol.name, offset])
+            elif kind == 'usepackage':
+                packages.add(other_symbol.name)
+                packages_detailed[other_symbol.name] = [offset, other_symbol.length]
+            elif kind == 'bibitem':
+                bibitems.add(other_symbol.name)
+
+        symbols = dict()
+        symbols['labels'] = labels
+        symbols['labels_with_offset'] = labels_with_offset
+        symbols['included_latex_files'] = included_latex_files
+        symbols['todos'] = todos
+        symbols['todos_with_offset'] = todos_with_offset
+        symbols['bibliographies'] = bibliographies
+        symbols['bibitems'] = bibitems
+        symbols['packages'] = packages
+        symbols['packages_detailed'] = packages_detailed
+        return symbols
+
+    def get_symbol_values(self, other_symbol):
+        ''' Returns the symbol category of a symbol and its values. '''
+
+        kind = other_symbol.kind
+        if kind == 'label':
+            return ('labels', [other_symbol.name])
+        elif kind == 'include' or kind == 'input' or kind == 'subfile' or kind == 'subimport':
+            filename = other_symbol.name
+            if not filename.endswith('.tex'):
+                filename += '.tex'
+            return ('included_latex_files', [filename])
+        elif kind == 'bibliography':
+            return ('bibliographies', [entry.strip() + '.bib' for entry in other_symbol.name.split(',')])
+        elif kind == 'addbibresource':
+            return ('bibliographies', [entry.strip() for entry in other_symbol.name.split(',')])
+        elif kind == 'todo':
+            return ('todos', [other_symbol.name])
+        elif kind == 'usepackage':
+            return ('packages', [other_symbol.name])
+        elif kind == 'bibitem':
+            return ('bibitems', [other_symbol.name])
+        return (None, [])
+
+    @timer
+    def update_symbol_counts(self, removed, added):
+        ''' Count how often each label, package, ... occurs, so the sets
+            only change when a count drops to zero or becomes positive. '''
+
+        differences = dict()
+        for entries, difference in [(removed, -1), (added, 1)]:
+            for (other_symbol, offset) in entries:
+                category, values = self.get_symbol_values(other_symbol)
+                if category in self.symbol_counts:
+                    for value in values:
+                        differences[(category, value)] = differences.get((category, value), 0) + difference
+
+        self.changed_symbol_sets = set()
+        for (category, value), difference in differences.items():
+            if difference == 0: continue
+
+            counts = self.symbol_counts[category]
+            count = counts.get(value, 0) + difference
+            if count <= 0:
+                del(counts[value])
+                self.changed_symbol_sets.add(category)
+            else:
+                if count == difference:
+                    self.changed_symbol_sets.add(category)
+                counts[value] = count
+
+    @timer
+    def update_symbols(self):
+        for category in self.changed_symbol_sets:
+            self.document.symbols[category] = set(self.symbol_counts[category])
+
+        begin_document = self.get_document_symbols()[0]
+        self.document.symbols['begin_document_offset'] = begin_document[1] if begin_document != None else None
+
+    @timer
+    def update_derived_symbols(self):
+        ''' Blocks and lists of symbols with their offsets move with
+            every edit, they are only built when they are read and only
+            if they changed. '''
+
+        if self.blocks_outdated:
+            self.blocks_outdated = False
+            self.document.set_blocks(self.get_blocks_from_list())
+
+        for key in self.outdated_symbol_lists:
+            symbols = self.symbol_lists[key]
+            if key == 'labels_with_offset' or key == 'todos_with_offset':
+                self.document.symbols[key] = [[other_symbol.name, offset] for (other_symbol, offset) in symbols]
+            elif key == 'included_latex_files':
+                self.document.symbols[key] = [(self.get_symbol_values(other_symbol)[1][0], offset) for (other_symbol, offset) in symbols]
+            elif key == 'packages_detailed':
+                self.document.symbols[key] = dict((other_symbol.name, [offset, other_symbol.length]) for (other_symbol, offset) in symbols)
+        self.outdated_symbol_lists = set()
+
+    def check_against_full_recompute(self):
+        self.update_derived_symbols()
+
+        blocks = self.compute_blocks()
+        if blocks != self.document.get_blocks():
+            print('ParserLaTeX: incremental blocks differ from full recompute', file=sys.stderr)
+            self.document.set_blocks(blocks)
+
+        for key, value in self.compute_symbols().items():
+            if value != self.document.symbols[key]:
+                print('ParserLaTeX: incremental symbols differ from full recompute (' + key + ')', file=sys.stderr)
+                self.document.symbols[key] = value
 
 
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import sys
+
+
+class Symbol(object):
+    ''' A symbol found by the parser, e.g. kind 'begin' and name 'itemize'
+        or kind 'usepackage' and name 'amsmath'. Line and offset are kept
+        by the symbol list, length is the length of the matched text. '''
+
+    __slots__ = ('kind', 'name', 'length')
+
+    def __init__(self, kind, name, length):
+        self.kind = sys.intern(kind)
+        self.name = name
+        self.length = length
+
+
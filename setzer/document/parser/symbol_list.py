@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+class SymbolList(object):
+    ''' Sorted list of parser symbols, shifted lazily on edits.
+
+        Entries are tuples (payload, line, offset) if has_lines is set,
+        (payload, offset) otherwise. They are sorted by entry[1].
+
+        Entries at index >= self.gap still have to be shifted by
+        self.line_delta / self.offset_delta. Edits only touch the
+        symbols on the changed lines plus the entries between the
+        last and the current edit position, like a gap buffer. '''
+
+    def __init__(self, has_lines=True):
+        self.has_lines = has_lines
+        self.entries = list()
+        self.gap = 0
+        self.line_delta = 0
+        self.offset_delta = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        entries = self.entries
+        for index in range(self.gap):
+            yield entries[index]
+        if self.line_delta == 0 and self.offset_delta == 0:
+            for index in range(self.gap, len(entries)):
+                yield entries[index]
+        else:
+            for index in range(self.gap, len(entries)):
+                yield self.shift(entries[index], self.line_delta, self.offset_delta)
+
+    def __reversed__(self):
+        for index in range(len(self.entries) - 1, -1, -1):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.entries)
+        if index >= self.gap:
+            return self.shift(self.entries[index], self.line_delta, self.offset_delta)
+        return self.entries[index]
+
+    def shift(self, entry, line_delta, offset_delta):
+        if self.has_lines:
+            return (entry[0], entry[1] + line_delta, entry[2] + offset_delta)
+        else:
+            return (entry[0], entry[1] + offset_delta)
+
+    def get_key(self, index):
+        if index >= self.gap:
+            if self.has_lines:
+                return self.entries[index][1] + self.line_delta
+            return self.entries[index][1] + self.offset_delta
+        return self.entries[index][1]
+
+    def bisect_left(self, key):
+        low, high = 0, len(self.entries)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def bisect_right(self, key):
+        low, high = 0, len(self.entries)
+        while low < high:
+            middle = (low + high) // 2
+            if key < self.get_key(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def move_gap(self, index):
+        entries = self.entries
+        if self.line_delta != 0 or self.offset_delta != 0:
+            if index > self.gap:
+                for i in range(self.gap, index):
+                    entries[i] = self.shift(entries[i], self.line_delta, self.offset_delta)
+            elif index < self.gap:
+                for i in range(index, self.gap):
+                    entries[i] = self.shift(entries[i], -self.line_delta, -self.offset_delta)
+        self.gap = index
+
+    def replace(self, key_start, key_end, new_entries, line_delta, offset_delta):
+        ''' Remove all entries with key_start <= key <= key_end, insert
+            new_entries in their place and shift all following entries
+            by line_delta / offset_delta. Returns the removed entries. '''
+
+        index_start = self.bisect_left(key_start)
+        index_end = self.bisect_right(key_end)
+
+        self.move_gap(index_end)
+        removed_entries = self.entries[index_start:index_end]
+        self.entries[index_start:index_end] = new_entries
+        self.gap = index_start + len(new_entries)
+        self.line_delta += line_delta
+        self.offset_delta += offset_delta
+        return removed_entries
+
+    def set_entries(self, entries):
+        self.entries = list(entries)
+        self.gap = len(self.entries)
+        self.line_delta = 0
+        self.offset_delta = 0
+
+
+class BlockList(SymbolList):
+    ''' Blocks sorted by their start, shifted lazily like symbols.
+
+        Entries are tuples (data, line, offset, end_line, end_offset).
+        end_line and end_offset are None for sections ending at
+        \\end{document} or at the end of the text. Blocks are changed in
+        place without moving the gap, so updating the end of a block far
+        away from the last edit is cheap. '''
+
+    def __init__(self):
+        SymbolList.__init__(self, has_lines=True)
+        self.bulk_entries = None
+
+    def shift(self, entry, line_delta, offset_delta):
+        if entry[3] == None:
+            return (entry[0], entry[1] + line_delta, entry[2] + offset_delta, None, None)
+        return (entry[0], entry[1] + line_delta, entry[2] + offset_delta, entry[3] + line_delta, entry[4] + offset_delta)
+
+    def find(self, line, offset):
+        ''' Returns the index of the block starting at line / offset, or
+            the index it would be inserted at, and whether it exists. '''
+
+        index = self.bisect_left(line)
+        offset_delta = self.offset_delta
+        while index < len(self.entries) and self.get_key(index) == line:
+            block_offset = self.entries[index][2]
+            if index >= self.gap:
+                block_offset += offset_delta
+            if block_offset == offset: return (index, True)
+            if block_offset > offset: break
+            index += 1
+        return (index, False)
+
+    def set_block(self, line, offset, end_line, end_offset, data):
+        entry = (data, line, offset, end_line, end_offset)
+        if self.bulk_entries != None:
+            self.bulk_entries.append(entry)
+            return
+
+        index, exists = self.find(line, offset)
+        if index >= self.gap:
+            entry = self.shift(entry, -self.line_delta, -self.offset_delta)
+        if exists:
+            self.entries[index] = entry
+        else:
+            self.entries.insert(index, entry)
+            if index < self.gap:
+                self.gap += 1
+
+    def remove_block(self, line, offset):
+        index, exists = self.find(line, offset)
+        if exists:
+            del(self.entries[index])
+            if index < self.gap:
+                self.gap -= 1
+
+    def get_blocks(self, end_document, end_text):
+        ''' Returns the blocks as lists [offset, end_offset, line, end_line,
+            *data]. Blocks without an end end one line before end_document
+            if they start before it, at end_text otherwise. Both are tuples
+            (line, offset), end_document may be None. '''
+
+        blocks = list()
+        append = blocks.append
+        entries = self.entries
+        line_delta = self.line_delta
+        offset_delta = self.offset_delta
+        for entry in entries[:self.gap]:
+            if entry[3] == None:
+                if end_document != None and entry[2] < end_document[1]:
+                    append([entry[2], end_document[1] - 1, entry[1], end_document[0] - 1, *entry[0]])
+                else:
+                    append([entry[2], end_text[1], entry[1], end_text[0], *entry[0]])
+            else:
+                append([entry[2], entry[4], entry[1], entry[3], *entry[0]])
+        for entry in entries[self.gap:]:
+            offset = entry[2] + offset_delta
+            if entry[3] == None:
+                if end_document != None and offset < end_document[1]:
+                    append([offset, end_document[1] - 1, entry[1] + line_delta, end_document[0] - 1, *entry[0]])
+                else:
+                    append([offset, end_text[1], entry[1] + line_delta, end_text[0], *entry[0]])
+            else:
+                append([offset, entry[4] + offset_delta, entry[1] + line_delta, entry[3] + line_delta, *entry[0]])
+        return blocks
+
+    def begin_bulk_update(self):
+        ''' Collect all blocks from scratch, they are sorted once in
+            end_bulk_update(). '''
+
+        self.bulk_entries = list()
+
+    def end_bulk_update(self):
+        self.set_entries(sorted(self.bulk_entries, key=lambda entry: entry[2]))
+        self.bulk_entries = None
+
+
@@ -17,29 +17,71 @@
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import GObject
+gi.require_version('Poppler', '0.18')
+from gi.repository import GLib
+from gi.repository import Poppler
 import cairo
 
-import _thread as thread, queue
-import time
+import _thread as thread
+import threading
+import heapq
+import itertools
+import hashlib
+import os
 import math
 
+from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.observable import Observable
+from setzer.helpers.timer import timer
 
 
 class PreviewPageRenderer(Observable):
+    ''' Pages are rendered in square tiles of tile_size pixels by a pool
+        of worker threads. Poppler documents can't be used from several
+        threads at once, so each worker opens the pdf itself. Tiles in
+        the visible part of the preview are rendered first.
+
+        rendered_pages: page number -> [tiles, page_width, pdf_date],
+        tiles: (column, row) -> surface.
+
+        Visible pages are first rendered as a whole at preview_scale,
+        before their tiles. These previews are kept after a rebuild or a
+        change of the zoom level until a new one is ready, so the preview
+        shows a scaled low resolution page instead of a blank one.
+
+        preview_pages: page number -> [surface, page_width, pdf_date].
+
+        The preview render of a page also yields its fingerprint, a hash
+        of the preview pixels, the text and the positions of the glyphs.
+        After a rebuild, tiles of a page are kept if its fingerprint
+        didn't change, so only edited pages are rendered again.
+
+        page_fingerprints: page number -> (pdf_date, fingerprint).
+
+        Memory is accounted per page in the PreviewSurfaceCache of the
+        workspace, which may drop pages that aren't visible.
+
+        Workers wait on a condition while there's nothing to render or the
+        preview is inactive, finished tiles are handed to the main loop
+        with GLib.idle_add. Nothing runs while the preview is idle. When
+        the document is closed, shut_down() ends the workers. '''
 
     def __init__(self, preview):
         Observable.__init__(self)
         self.preview = preview
-        self.maximum_rendered_pixels = 20000000
+        self.tile_size = 512
+        self.preview_scale = 0.25
+        self.number_of_workers = max(1, min(4, (os.cpu_count() or 1) - 1))
 
         self.visible_pages_lock = thread.allocate_lock()
         self.visible_pages = list()
+        self.visible_pages_additional = list()
+        self.visible_area = None
         self.page_width = None
         self.pdf_date = None
         self.rendered_pages = dict()
-        self.is_active_lock = thread.allocate_lock()
+        self.preview_pages = dict()
+        self.page_fingerprints = dict()
         self.is_active = False
 
         self.preview.connect('position_changed', self.on_layout_or_position_changed)
@@ -47,81 +89,253 @@ class PreviewPageRenderer(Observable):
 
         self.page_render_count_lock = thread.allocate_lock()
         self.page_render_count = dict()
-        self.render_queue = queue.Queue()
-        self.render_queue_low_priority = queue.Queue()
-        self.rendered_pages_queue = queue.Queue()
-        thread.start_new_thread(self.render_page_loop, ())
-        GObject.timeout_add(50, self.rendered_pages_loop)
+        # heap of (priority, sequence number, todo), lower priorities first,
+        # also guards is_active and is_shut_down
+        self.is_shut_down = False
+        self.render_queue = list()
+        self.render_queue_condition = threading.Condition()
+        self.render_sequence = itertools.count()
+        self.rendered_tiles = list()
+        self.rendered_tiles_lock = thread.allocate_lock()
+        self.rendered_tiles_idle_scheduled = False
+        for i in range(self.number_of_workers):
+            thread.start_new_thread(self.render_page_loop, ())
 
     def on_layout_or_position_changed(self, notifying_object):
         if self.preview.layout != None:
             self.update_rendered_pages()
         else:
             self.rendered_pages = dict()
+            self.preview_pages = dict()
+            self.page_fingerprints = dict()
+            self.get_surface_cache().remove_renderer(self)
 
     def activate(self):
-        with self.is_active_lock:
+        with self.render_queue_condition:
+            if self.is_shut_down: return
             self.is_active = True
+            self.render_queue_condition.notify_all()
         self.update_rendered_pages()
 
     def deactivate(self):
-        with self.is_active_lock:
+        with self.render_queue_condition:
             self.is_active = False
+            self.render_queue = list()
         self.rendered_pages = dict()
+        self.preview_pages = dict()
+        self.page_fingerprints = dict()
+        self.get_surface_cache().remove_renderer(self)
         with self.visible_pages_lock:
             self.visible_pages = list()
         self.page_width = None
         self.pdf_date = None
 
+    def shut_down(self):
+        ''' Wake all workers and let them exit, this releases their
+            Poppler documents. '''
+
+        with self.render_queue_condition:
+            self.is_shut_down = True
+            self.render_queue_condition.notify_all()
+        self.deactivate()
+
     def render_page_loop(self):
+        ''' One worker, with its own Poppler document. '''
+
+        poppler_document = None
+        poppler_document_key = None
+
         while True:
-            with self.is_active_lock:
-                is_active = self.is_active
-            if is_active:
-                try: todo = self.render_queue.get(block=False)
-                except queue.Empty:
-                    try: todo = self.render_queue_low_priority.get(block=False)
-                    except queue.Empty:
-                        todo = None
-                        time.sleep(0.05)
-                if todo != None:
-                    with self.page_render_count_lock:
-                        render_count = self.page_render_count[todo['page_number']]
-                    with self.visible_pages_lock:
-                        is_visible = (todo['page_number'] >= self.visible_pages_additional[0] and todo['page_number'] <= self.visible_pages_additional[1])
-                    if todo['render_count'] == render_count and is_visible:
-                        surface = cairo.ImageSurface(cairo.Format.ARGB32, todo['page_width'] * todo['hidpi_factor'], todo['page_height'] * 2)
-                        ctx = cairo.Context(surface)
-                        ctx.scale(todo['scale_factor'] * todo['hidpi_factor'], todo['scale_factor'] * todo['hidpi_factor'])
-                        page = self.preview.poppler_document.get_page(todo['page_number'])
-                        page.render(ctx)
-                        self.rendered_pages_queue.put({'page_number': todo['page_number'], 'item': [surface, todo['page_width'], todo['pdf_date']]})
-            else:
-                time.sleep(0.05)
+            with self.render_queue_condition:
+                while not self.is_shut_down and (not self.is_active or len(self.render_queue) == 0):
+                    self.render_queue_condition.wait()
+                if self.is_shut_down: break
+                todo = heapq.heappop(self.render_queue)[2]
+
+            if self.is_current(todo):
+                if poppler_document_key != (todo['pdf_filename'], todo['pdf_date']):
+                    try:
+                        poppler_document = Poppler.Document.new_from_file(GLib.filename_to_uri(todo['pdf_filename']))
+                    except (TypeError, GLib.Error):
+                        poppler_document = None
+                    poppler_document_key = (todo['pdf_filename'], todo['pdf_date'])
+                if poppler_document != None and todo['page_number'] < poppler_document.get_n_pages():
+                    if todo['tile'] == None:
+                        surface = self.render_preview(poppler_document, todo)
+                        fingerprint = self.get_fingerprint(poppler_document.get_page(todo['page_number']), surface)
+                    else:
+                        surface = self.render_tile(poppler_document, todo)
+                        fingerprint = None
+                    self.add_rendered_tile({'page_number': todo['page_number'], 'tile': todo['tile'], 'surface': surface, 'fingerprint': fingerprint, 'page_width': todo['page_width'], 'pdf_date': todo['pdf_date']})
 
-    def rendered_pages_loop(self):
-        with self.is_active_lock:
-            is_active = self.is_active
-        if not is_active: return True
+    def add_rendered_tile(self, rendered_tile):
+        ''' Tiles finished while the main loop is busy are applied together. '''
+
+        with self.rendered_tiles_lock:
+            self.rendered_tiles.append(rendered_tile)
+            if self.rendered_tiles_idle_scheduled: return
+            self.rendered_tiles_idle_scheduled = True
+        GLib.idle_add(self.apply_rendered_tiles)
+
+    def is_current(self, todo):
+        with self.page_render_count_lock:
+            render_count = self.page_render_count[todo['page_number']]
+        with self.visible_pages_lock:
+            is_visible = (todo['page_number'] >= self.visible_pages_additional[0] and todo['page_number'] <= self.visible_pages_additional[1])
+        return todo['render_count'] == render_count and is_visible
+
+    def render_tile(self, poppler_document, todo):
+        column, row = todo['tile']
+        width, height = self.get_tile_size(todo['tile'], todo['surface_width'], todo['surface_height'])
+
+        surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        ctx = cairo.Context(surface)
+        # opaque, so previews drawn below don't shine through
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.paint()
+        ctx.translate(- column * self.tile_size, - row * self.tile_size)
+        ctx.scale(todo['scale_factor'] * todo['hidpi_factor'], todo['scale_factor'] * todo['hidpi_factor'])
+        poppler_document.get_page(todo['page_number']).render(ctx)
+        return surface
+
+    def render_preview(self, poppler_document, todo):
+        width = max(math.ceil(todo['surface_width'] * self.preview_scale), 1)
+        height = max(math.ceil(todo['surface_height'] * self.preview_scale), 1)
+
+        surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        ctx = cairo.Context(surface)
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.paint()
+        ctx.scale(todo['scale_factor'] * todo['hidpi_factor'] * self.preview_scale, todo['scale_factor'] * todo['hidpi_factor'] * self.preview_scale)
+        poppler_document.get_page(todo['page_number']).render(ctx)
+        return surface
+
+    def get_fingerprint(self, poppler_page, preview_surface):
+        ''' The preview pixels catch changed graphics, text and glyph
+            positions catch changes too small to show at preview_scale. '''
+
+        hash_object = hashlib.sha1()
+        preview_surface.flush()
+        hash_object.update(preview_surface.get_data())
+        hash_object.update(str(poppler_page.get_size()).encode('utf-8'))
+        hash_object.update(poppler_page.get_text().encode('utf-8'))
+        success, rectangles = poppler_page.get_text_layout()
+        if success:
+            hash_object.update(''.join('{:.2f},{:.2f},{:.2f},{:.2f};'.format(rectangle.x1, rectangle.y1, rectangle.x2, rectangle.y2) for rectangle in rectangles).encode('utf-8'))
+        return hash_object.hexdigest()
+
+    def get_tile_size(self, tile, surface_width, surface_height):
+        column, row = tile
+        return (min(self.tile_size, surface_width - column * self.tile_size), min(self.tile_size, surface_height - row * self.tile_size))
+
+    def get_tiles(self, surface_width, surface_height):
+        return [(column, row) for row in range(math.ceil(surface_height / self.tile_size)) for column in range(math.ceil(surface_width / self.tile_size))]
+
+    def apply_rendered_tiles(self):
+        with self.rendered_tiles_lock:
+            rendered_tiles = self.rendered_tiles
+            self.rendered_tiles = list()
+            self.rendered_tiles_idle_scheduled = False
+        if not self.is_active: return False
 
         changed = False
-        while self.rendered_pages_queue.empty() == False:
-            try: todo = self.rendered_pages_queue.get(block=False)
-            except queue.Empty: pass
-            else:
-                try:
-                    del(self.rendered_pages[todo['page_number']])
-                except KeyError: pass
-                self.rendered_pages[todo['page_number']] = todo['item']
+        fingerprints_changed = False
+        changed_pages = set()
+        for todo in rendered_tiles:
+            # rendered for an earlier zoom level or pdf
+            if todo['page_width'] != self.page_width or todo['pdf_date'] != self.pdf_date: continue
+
+            if todo['tile'] == None:
+                self.apply_fingerprint(todo['page_number'], todo['fingerprint'], todo['pdf_date'])
+                self.preview_pages[todo['page_number']] = [todo['surface'], todo['page_width'], todo['pdf_date']]
+                changed_pages.add(todo['page_number'])
                 changed = True
+                fingerprints_changed = True
+                continue
+
+            rendered_page = self.rendered_pages.get(todo['page_number'])
+            if rendered_page == None or rendered_page[1] != todo['page_width'] or rendered_page[2] != todo['pdf_date']:
+                rendered_page = [dict(), todo['page_width'], todo['pdf_date']]
+                self.rendered_pages[todo['page_number']] = rendered_page
+            rendered_page[0][todo['tile']] = todo['surface']
+            changed_pages.add(todo['page_number'])
+            changed = True
+        for page_number in changed_pages:
+            self.update_page_memory(page_number)
+        self.get_surface_cache().shrink()
         if changed:
             self.add_change_code('rendered_pages_changed')
-        return True
+        # tiles of pages that waited for their fingerprint
+        if fingerprints_changed:
+            self.update_rendered_pages(force=True)
+        return False
+
+    def apply_fingerprint(self, page_number, fingerprint, pdf_date):
+        ''' Tiles of an earlier pdf are kept if the page looks the same. '''
+
+        rendered_page = self.rendered_pages.get(page_number)
+        if rendered_page != None and rendered_page[2] != pdf_date:
+            old_fingerprint = self.page_fingerprints.get(page_number)
+            if old_fingerprint != None and old_fingerprint == (rendered_page[2], fingerprint):
+                rendered_page[2] = pdf_date
+            else:
+                del(self.rendered_pages[page_number])
+        self.page_fingerprints[page_number] = (pdf_date, fingerprint)
+
+    def get_surface_cache(self):
+        return ServiceLocator.get_workspace().preview_surface_cache
+
+    def update_page_memory(self, page_number):
+        size = 0
+        if page_number in self.rendered_pages:
+            size += sum(surface.get_stride() * surface.get_height() for surface in self.rendered_pages[page_number][0].values())
+        if page_number in self.preview_pages:
+            size += self.preview_pages[page_number][0].get_stride() * self.preview_pages[page_number][0].get_height()
+        self.get_surface_cache().set_page_memory(self, page_number, size)
+
+    def is_page_visible(self, page_number):
+        with self.visible_pages_lock:
+            if len(self.visible_pages) == 0: return False
+            return (page_number >= self.visible_pages[0] and page_number <= self.visible_pages[1])
+
+    def drop_page_tiles(self, page_number):
+        ''' Keeps only the low resolution preview of the page. '''
+
+        if page_number in self.rendered_pages:
+            del(self.rendered_pages[page_number])
+            self.update_page_memory(page_number)
+            self.add_change_code('rendered_pages_changed')
+
+    def drop_page(self, page_number):
+        if page_number in self.rendered_pages:
+            del(self.rendered_pages[page_number])
+        if page_number in self.preview_pages:
+            del(self.preview_pages[page_number])
+        self.update_page_memory(page_number)
+        self.add_change_code('rendered_pages_changed')
 
-    def update_rendered_pages(self):
-        with self.is_active_lock:
-            is_active = self.is_active
-        if not is_active: return
+    def get_tile_priority(self, page_number, tile, visible_pages, hidpi_factor):
+        ''' 0 for tiles in the visible area, 1 for the rest of visible
+            pages, 2 for pages around them. '''
+
+        if page_number < visible_pages[0] or page_number > visible_pages[1]:
+            return 2
+        if self.visible_area == None:
+            return 1
+
+        x0, y0, x1, y1 = self.visible_area
+        page_offset = page_number * (self.preview.layout.page_height + self.preview.layout.page_gap)
+        tile_x0 = tile[0] * self.tile_size / hidpi_factor
+        tile_y0 = tile[1] * self.tile_size / hidpi_factor + page_offset
+        tile_x1 = tile_x0 + self.tile_size / hidpi_factor
+        tile_y1 = tile_y0 + self.tile_size / hidpi_factor
+        if tile_x1 > x0 and tile_x0 < x1 and tile_y1 > y0 and tile_y0 < y1:
+            return 0
+        return 1
+
+    @timer
+    def update_rendered_pages(self, force=False):
+        if not self.is_active: return
         if self.preview.layout == None: return
 
         hidpi_factor = self.preview.layout.hidpi_factor
@@ -133,12 +347,19 @@ class PreviewPageRenderer(Observable):
 
         visible_pages = [current_page, min(current_page + math.floor(self.preview.view.get_allocated_height() / page_height) + 1, self.preview.poppler_document.get_n_pages() - 1)]
 
-        max_additional_pages = max(math.floor(self.maximum_rendered_pixels / (page_width * page_height * hidpi_factor * hidpi_factor) - visible_pages[1] + visible_pages[0]), 0)
+        # tiles and previews of the pages around the visible ones fit into the memory budget
+        maximum_rendered_pixels = self.get_surface_cache().get_budget() / (4 * (1 + self.preview_scale ** 2))
+        max_additional_pages = max(math.floor(maximum_rendered_pixels / (page_width * page_height * hidpi_factor * hidpi_factor) - visible_pages[1] + visible_pages[0]), 0)
         visible_pages_additional = [max(int(visible_pages[0] - max_additional_pages / 2), 0), min(int(visible_pages[1] + max_additional_pages / 2), self.preview.poppler_document.get_n_pages() - 1)]
 
+        # in page coordinates, horizontally relative to the left edge of the pages
+        window_width = self.preview.view.get_allocated_width()
+        hoffset = self.preview.view.scrolled_window.get_hadjustment().get_value() - self.preview.layout.get_horizontal_margin(window_width)
+        visible_area = (hoffset, offset, hoffset + window_width, offset + self.preview.view.get_allocated_height())
+
         pdf_date = self.preview.get_pdf_date()
         with self.visible_pages_lock:
-            if pdf_date == self.pdf_date and visible_pages == self.visible_pages and visible_pages_additional == self.visible_pages_additional and page_width == self.page_width:
+            if not force and pdf_date == self.pdf_date and visible_pages == self.visible_pages and visible_pages_additional == self.visible_pages_additional and page_width == self.page_width and visible_area == self.visible_area:
                 do_return = True
             else:
                 do_return = False
@@ -146,29 +367,80 @@ class PreviewPageRenderer(Observable):
         with self.visible_pages_lock:
             self.visible_pages = visible_pages
             self.visible_pages_additional = visible_pages_additional
+        self.visible_area = visible_area
         self.page_width = page_width
         self.pdf_date = pdf_date
 
         changed = False
+        changed_pages = set()
         for page_number in list(self.rendered_pages):
-            if self.rendered_pages[page_number][2] != pdf_date or page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
+            # tiles of earlier pdfs wait for the new fingerprint of their page
+            fingerprint = self.page_fingerprints.get(page_number)
+            can_be_reused = (fingerprint != None and fingerprint[0] == self.rendered_pages[page_number][2])
+            if (self.rendered_pages[page_number][2] != pdf_date and not can_be_reused) or page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
                 del(self.rendered_pages[page_number])
+                changed_pages.add(page_number)
                 changed = True
+        # previews of earlier pdfs and zoom levels stay until they are replaced
+        for page_number in list(self.preview_pages):
+            if page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
+                del(self.preview_pages[page_number])
+                changed_pages.add(page_number)
+                changed = True
+        for page_number in list(self.page_fingerprints):
+            if page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
+                del(self.page_fingerprints[page_number])
+        for page_number in changed_pages:
+            self.update_page_memory(page_number)
+        for page_number in range(visible_pages[0], visible_pages[1] + 1):
+            self.get_surface_cache().touch(self, page_number)
         if changed:
             self.add_change_code('rendered_pages_changed')
 
         scale_factor = self.preview.layout.scale_factor
+        surface_width = page_width * hidpi_factor
+        surface_height = page_height * hidpi_factor
 
-        for page_number in range(0, self.preview.poppler_document.get_n_pages()):
-            if page_number not in self.rendered_pages or self.rendered_pages[page_number][1] != page_width or self.rendered_pages[page_number][2] != pdf_date:
-                with self.page_render_count_lock:
-                    try:
-                        self.page_render_count[page_number] += 1
-                    except KeyError:
-                        self.page_render_count[page_number] = 1
-                    if visible_pages != None and page_number >= visible_pages[0] and page_number <= visible_pages[1]:
-                        self.render_queue.put({'page_number': page_number, 'render_count': self.page_render_count[page_number], 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'page_height': page_height, 'pdf_date': pdf_date})
-                    elif page_number >= visible_pages_additional[0] and page_number <= visible_pages_additional[1]:
-                        self.render_queue_low_priority.put({'page_number': page_number, 'render_count': self.page_render_count[page_number], 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'page_height': page_height, 'pdf_date': pdf_date})
+        new_todos = list()
+        for page_number in range(visible_pages_additional[0], visible_pages_additional[1] + 1):
+            rendered_page = self.rendered_pages.get(page_number)
+            if rendered_page != None and rendered_page[2] != pdf_date:
+                # tiles that may be reused, wait for the fingerprint
+                tiles = list()
+            elif rendered_page != None and rendered_page[1] == page_width:
+                tiles = [tile for tile in self.get_tiles(surface_width, surface_height) if tile not in rendered_page[0]]
+            else:
+                tiles = self.get_tiles(surface_width, surface_height)
+
+            # a quick low resolution pass for visible pages, before all tiles,
+            # it also yields the fingerprint of pages rendered for later rebuilds
+            is_visible = (page_number >= visible_pages[0] and page_number <= visible_pages[1])
+            fingerprint = self.page_fingerprints.get(page_number)
+            preview_page = self.preview_pages.get(page_number)
+            needs_preview = (fingerprint == None or fingerprint[0] != pdf_date)
+            needs_preview = needs_preview or (is_visible and (preview_page == None or preview_page[1] != page_width or preview_page[2] != pdf_date))
+            if len(tiles) == 0 and not needs_preview: continue
+
+            with self.page_render_count_lock:
+                try:
+                    self.page_render_count[page_number] += 1
+                except KeyError:
+                    self.page_render_count[page_number] = 1
+                render_count = self.page_render_count[page_number]
+
+            if needs_preview:
+                todo = {'page_number': page_number, 'tile': None, 'render_count': render_count, 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'surface_width': surface_width, 'surface_height': surface_height, 'pdf_filename': self.preview.pdf_filename, 'pdf_date': pdf_date}
+                new_todos.append((-1 if is_visible else 2, next(self.render_sequence), todo))
+
+            for tile in tiles:
+                priority = self.get_tile_priority(page_number, tile, visible_pages, hidpi_factor)
+                todo = {'page_number': page_number, 'tile': tile, 'render_count': render_count, 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'surface_width': surface_width, 'surface_height': surface_height, 'pdf_filename': self.preview.pdf_filename, 'pdf_date': pdf_date}
+                new_todos.append((priority, next(self.render_sequence), todo))
+
+        # todos of earlier calls are outdated now
+        with self.render_queue_condition:
+            self.render_queue = new_todos
+            heapq.heapify(self.render_queue)
+            self.render_queue_condition.notify_all()
 
 
@@ -109,7 +109,7 @@ class PreviewPresenter(object):
         self.view.scrolled_window.get_hadjustment().set_value(position[0])
         self.view.scrolled_window.get_vadjustment().set_value(position[1])
 
-    #@timer
+    @timer
     def draw(self, drawing_area, ctx, data = None):
         if self.preview.layout != None:
             bg_color = self.color_manager.get_theme_color('theme_bg_color')
@@ -140,7 +140,7 @@ class PreviewPresenter(object):
         ctx.set_source_rgba(bg_color.red, bg_color.green, bg_color.blue, bg_color.alpha)
         ctx.fill()
 
-    #@timer
+    @timer
     def draw_page_background_and_outline(self, ctx, border_color):
         ctx.set_source_rgba(border_color.red, border_color.green, border_color.blue, border_color.alpha)
         ctx.rectangle(- self.preview.layout.border_width, - self.preview.layout.border_width, self.preview.layout.page_width + 2 * self.preview.layout.border_width, self.preview.layout.page_height + 2 * self.preview.layout.border_width)
@@ -150,24 +150,43 @@ class PreviewPresenter(object):
         ctx.fill()
 
     def draw_rendered_page(self, ctx, page_number):
+        matrix = ctx.get_matrix()
+        preview_page_data = self.page_renderer.preview_pages.get(page_number)
+        if preview_page_data != None:
+            surface = preview_page_data[0]
+            factor = self.preview.layout.page_width / surface.get_width()
+            ctx.scale(factor, factor)
+            ctx.set_source_surface(surface, 0, 0)
+            ctx.rectangle(0, 0, surface.get_width(), surface.get_height())
+            ctx.fill()
+            ctx.set_matrix(matrix)
+            if self.preview.invert_pdf:
+                ctx.set_operator(cairo.Operator.DIFFERENCE)
+                ctx.set_source_rgb(1, 1, 1)
+                ctx.rectangle(0, 0, self.preview.layout.page_width, self.preview.layout.page_height)
+                ctx.fill()
+                ctx.set_operator(cairo.Operator.OVER)
+
         if not page_number in self.page_renderer.rendered_pages: return
 
         rendered_page_data = self.page_renderer.rendered_pages[page_number]
-        surface = rendered_page_data[0]
+        tiles = rendered_page_data[0]
         page_width = rendered_page_data[1] * self.preview.layout.hidpi_factor
+        tile_size = self.page_renderer.tile_size
 
-        if not isinstance(surface, cairo.ImageSurface): return
-
-        matrix = ctx.get_matrix()
         factor = self.preview.layout.page_width / page_width
         ctx.scale(factor, factor)
-        ctx.set_source_surface(surface, 0, 0)
-        ctx.rectangle(0, 0, self.preview.layout.page_width / factor, self.preview.layout.page_height / factor)
-        ctx.fill()
+        for (column, row), surface in tiles.items():
+            if not isinstance(surface, cairo.ImageSurface): continue
+
+            ctx.set_source_surface(surface, column * tile_size, row * tile_size)
+            ctx.rectangle(column * tile_size, row * tile_size, surface.get_width(), surface.get_height())
+            ctx.fill()
         if self.preview.invert_pdf:
             ctx.set_operator(cairo.Operator.DIFFERENCE)
             ctx.set_source_rgb(1, 1, 1)
-            ctx.rectangle(0, 0, self.preview.layout.page_width / factor, self.preview.layout.page_height / factor)
+            for (column, row), surface in tiles.items():
+                ctx.rectangle(column * tile_size, row * tile_size, surface.get_width(), surface.get_height())
             ctx.fill()
             ctx.set_operator(cairo.Operator.OVER)
         ctx.set_matrix(matrix)
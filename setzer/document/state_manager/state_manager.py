@@ -63,7 +63,7 @@ class StateManager():
         try:
             self.document.build_system.build_log_data = document_data['build_log_data']
         except KeyError:
-            self.document.build_system.build_log_data = {'items': list(), 'error_count': 0, 'warning_count': 0, 'badbox_count': 0}
+            self.document.build_system.build_log_data = {'items': list(), 'error_count': 0, 'warning_count': 0, 'badbox_count': 0, 'timings': list()}
         try:
             self.document.build_system.document_has_been_built = document_data['has_been_built']
         except KeyError:
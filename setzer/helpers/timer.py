@@ -15,17 +15,117 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import os
+import sys
 import time
+import json
+import atexit
+import array
+import math
+
+
+# Profiling is switched on by setting SETZER_PROFILE, either to 1 or to
+# the file the statistics are written to on exit. When it's off @timer
+# returns the function unchanged, so decorated hot paths cost nothing.
+profile_setting = os.environ.get('SETZER_PROFILE', '')
+profiling_enabled = (profile_setting not in ['', '0'])
+if profile_setting in ['', '0', '1']:
+    profile_filename = os.path.join(os.getcwd(), 'setzer-profile.json')
+else:
+    profile_filename = profile_setting
+
+
+class Durations(object):
+    ''' Running count, total and max of the durations of one function,
+        plus a histogram with logarithmic buckets for the percentiles.
+        Memory use doesn't grow with the number of calls. '''
+
+    # buckets start at 1 µs, each one 2^(1/8) (about 9%) wider than the last
+    minimum = 0.000001
+    buckets_per_doubling = 8
+    number_of_buckets = 8 * 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = array.array('Q', bytes(8 * self.number_of_buckets))
+
+    def append(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if duration <= self.minimum:
+            index = 0
+        else:
+            index = min(int(math.log2(duration / self.minimum) * self.buckets_per_doubling), self.number_of_buckets - 1)
+        self.buckets[index] += 1
+
+    def get_percentile(self, fraction):
+        ''' Middle of the bucket the percentile falls into, at most max. '''
+
+        rank = int(round(fraction * (self.count - 1))) + 1
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.minimum * 2 ** ((index + 0.5) / self.buckets_per_doubling), self.max)
+        return self.max
+
+
+# function name -> Durations in seconds
+registry = dict()
 
 
 def timer(original_function):
-    
+    if not profiling_enabled: return original_function
+
+    name = original_function.__module__ + '.' + original_function.__qualname__
+    durations = registry.setdefault(name, Durations())
+
     def new_function(*args, **kwargs):
-        start_time = time.time()
-        return_value = original_function(*args, **kwargs)
-        print(original_function.__name__ + ': ' + str(time.time() - start_time) + ' seconds')
-        return return_value
-    
-    return  new_function
+        start_time = time.perf_counter()
+        try:
+            return original_function(*args, **kwargs)
+        finally:
+            durations.append(time.perf_counter() - start_time)
+
+    new_function.__name__ = original_function.__name__
+    new_function.__qualname__ = original_function.__qualname__
+    new_function.__doc__ = original_function.__doc__
+    return new_function
+
+
+def get_statistics():
+    ''' Count, total, p50/p95/p99 and max per function, times in ms.
+        Percentiles are accurate to about 5%. '''
+
+    statistics = dict()
+    for name, durations in registry.items():
+        if durations.count == 0: continue
+
+        statistics[name] = {'count': durations.count,
+                            'total': durations.total * 1000,
+                            'p50': durations.get_percentile(0.5) * 1000,
+                            'p95': durations.get_percentile(0.95) * 1000,
+                            'p99': durations.get_percentile(0.99) * 1000,
+                            'max': durations.max * 1000}
+    return statistics
+
+
+def dump_statistics():
+    statistics = get_statistics()
+    try:
+        with open(profile_filename, 'w') as f:
+            json.dump(statistics, f, indent=4, sort_keys=True)
+    except OSError as e:
+        print('Could not write profile to ' + profile_filename + ': ' + str(e), file=sys.stderr)
+    else:
+        print('Profile written to ' + profile_filename, file=sys.stderr)
+
+
+if profiling_enabled:
+    atexit.register(dump_statistics)
 
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class AutoBuild(object):
+    ''' Rebuilds the root document (or the active one) once the text of
+        an open document hasn't changed for build_on_change_delay ms.
+        Edits stop a build started here that is still running, builds
+        started by the user run to the end. At most one rebuild is
+        pending at a time. '''
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.settings = ServiceLocator.get_settings()
+
+        self.enabled = self.settings.get_value('preferences', 'build_on_change')
+        self.delay = self.settings.get_value('preferences', 'build_on_change_delay')
+        self.timeout_id = None
+        # document waiting for a build that was running to finish
+        self.pending_document = None
+        # build system -> last query started here
+        self.started_queries = dict()
+
+        self.workspace.connect('new_document', self.on_new_document)
+        self.workspace.connect('document_removed', self.on_document_removed)
+        self.settings.connect('settings_changed', self.on_settings_changed)
+
+    def on_new_document(self, workspace, document):
+        document.content.connect('buffer_changed', self.on_buffer_changed)
+        if document.is_latex_document():
+            document.build_system.connect('build_state_change', self.on_build_state_change)
+
+    def on_document_removed(self, workspace, document):
+        document.content.disconnect('buffer_changed', self.on_buffer_changed)
+        if document.is_latex_document():
+            document.build_system.disconnect('build_state_change', self.on_build_state_change)
+        if document == self.pending_document:
+            self.pending_document = None
+        if document.is_latex_document():
+            self.started_queries.pop(document.build_system, None)
+
+    def on_settings_changed(self, settings, parameter):
+        section, item, value = parameter
+        if (section, item) == ('preferences', 'build_on_change'):
+            self.enabled = value
+            if not self.enabled:
+                self.cancel()
+        if (section, item) == ('preferences', 'build_on_change_delay'):
+            self.delay = value
+
+    def on_buffer_changed(self, content, buffer):
+        if not self.enabled: return
+
+        document = self.workspace.get_root_or_active_latex_document()
+        if document == None: return
+
+        document.build_system.stop_query(self.started_queries.pop(document.build_system, None))
+        self.pending_document = None
+
+        if self.timeout_id != None:
+            GLib.source_remove(self.timeout_id)
+        self.timeout_id = GLib.timeout_add(self.delay, self.on_timeout)
+
+    def on_timeout(self):
+        self.timeout_id = None
+
+        document = self.workspace.get_root_or_active_latex_document()
+        if document == None or document.get_filename() == None: return False
+
+        if document.build_system.get_build_state() != 'idle':
+            self.pending_document = document
+        else:
+            self.build_in_background(document.build_system)
+        return False
+
+    def on_build_state_change(self, build_system, build_state):
+        if build_state != 'idle': return
+        if self.pending_document == None or self.pending_document.build_system != build_system: return
+
+        self.pending_document = None
+        GLib.idle_add(self.start_pending_build, build_system)
+
+    def start_pending_build(self, build_system):
+        if build_system.get_build_state() == 'idle':
+            self.build_in_background(build_system)
+        return False
+
+    def build_in_background(self, build_system):
+        query = build_system.build_in_background()
+        if query != None:
+            self.started_queries[build_system] = query
+
+    def cancel(self):
+        if self.timeout_id != None:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        self.pending_document = None
+
+
@@ -51,7 +51,7 @@ class BuildLog(Observable):
         self.update_items()
         self.document.build_system.connect('build_log_update', self.on_build_log_update)
 
-    #@timer
+    @timer
     def update_items(self, just_built=False):
         self.items = self.document.build_system.build_log_data['items']
         self.signal_finish_adding()
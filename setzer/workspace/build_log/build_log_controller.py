@@ -20,6 +20,8 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gdk
 from gi.repository import Gtk
 
+from setzer.dialogs.dialog_locator import DialogLocator
+
 
 class BuildLogController(object):
     
@@ -30,6 +32,7 @@ class BuildLogController(object):
         self.view.scrolled_window.connect('motion-notify-event', self.on_hover)
         self.view.scrolled_window.connect('leave-notify-event', self.on_leave)
         self.view.list.connect('button-press-event', self.on_button_press)
+        self.view.export_timings_button.connect('clicked', self.on_export_timings_button_click)
 
     def on_enter(self, widget, event):
         self.update_hover_state(event)
@@ -61,4 +64,9 @@ class BuildLogController(object):
                     self.build_log.workspace.active_document.content.scroll_cursor_onscreen()
                     self.build_log.workspace.active_document.view.source_view.grab_focus()
 
+    def on_export_timings_button_click(self, button):
+        if self.build_log.document == None: return
+
+        DialogLocator.get_dialog('export_build_timings').run(self.build_log.document)
+
 
@@ -63,7 +63,7 @@ class BuildLogPresenter(object):
     def on_hover_item_changed(self, build_log):
         self.view.list.queue_draw()
 
-    #@timer
+    @timer
     def draw(self, drawing_area, ctx):
         update_size = False
 
@@ -165,7 +165,33 @@ class BuildLogPresenter(object):
 
             markup += ').'
             self.view.header_label.set_markup(markup)
+            self.view.timings_label.set_text(self.get_timings_text(self.build_log.document.build_system.get_timings()))
         else:
             self.view.header_label.set_markup('')
+            self.view.timings_label.set_text('')
+        self.view.export_timings_button.set_sensitive(tried_building and len(self.build_log.document.build_system.get_timings()) > 0)
+
+    def get_timings_text(self, timings):
+        ''' One entry per job in the order they finished, the steps of a
+            LaTeX pass in parentheses. '''
+
+        job_names = {'build_latex': _('LaTeX pass {number}'), 'build_bibtex': 'BibTeX', 'build_biber': 'Biber',
+                     'build_makeindex': 'Makeindex', 'build_glossaries': _('Glossaries'), 'build_format': _('Preamble format'),
+                     'write_snapshot': _('Snapshot'), 'use_build_cache': _('Build cache'), 'forward_sync': 'SyncTeX', 'backward_sync': 'SyncTeX'}
+        step_names = {'interpreter': _('interpreter'), 'parse_log': _('log parsing'), 'copy_synctex': _('SyncTeX copy'), 'cleanup': _('cleanup')}
+
+        steps = dict()
+        for timing in timings:
+            if timing['step'] != None:
+                steps.setdefault((timing['job'], timing['pass']), list()).append(step_names.get(timing['step'], timing['step']) + ' {:.2f}s'.format(timing['seconds']))
+
+        entries = list()
+        for timing in timings:
+            if timing['step'] != None: continue
+            text = job_names.get(timing['job'], timing['job']).format(number=str(timing['pass'])) + ': {:.2f}s'.format(timing['seconds'])
+            if (timing['job'], timing['pass']) in steps:
+                text += ' (' + ', '.join(steps[(timing['job'], timing['pass'])]) + ')'
+            entries.append(text)
+        return ' · '.join(entries)
     
 
@@ -49,11 +49,23 @@ class BuildLogView(Gtk.VBox):
         self.close_button.get_style_context().add_class('flat')
         self.close_button.set_can_focus(False)
         self.close_button.set_action_name('win.close-build-log')
+        self.export_timings_button = Gtk.Button.new_from_icon_name('document-save-symbolic', Gtk.IconSize.MENU)
+        self.export_timings_button.get_style_context().add_class('flat')
+        self.export_timings_button.set_can_focus(False)
+        self.export_timings_button.set_tooltip_text(_('Save build timings as JSON'))
         self.header_label = Gtk.Label()
         self.header_label.set_size_request(300, -1)
         self.header_label.set_xalign(0)
         self.header_label.set_margin_left(0)
-        self.header.pack_start(self.header_label, True, True, 0)
+        self.timings_label = Gtk.Label()
+        self.timings_label.set_xalign(0)
+        self.timings_label.set_line_wrap(True)
+        self.timings_label.get_style_context().add_class('dim-label')
+        self.header_labels = Gtk.VBox()
+        self.header_labels.pack_start(self.header_label, False, False, 0)
+        self.header_labels.pack_start(self.timings_label, False, False, 0)
+        self.header.pack_start(self.header_labels, True, True, 0)
+        self.header.pack_start(self.export_timings_button, False, False, 0)
         self.header.pack_start(self.close_button, False, False, 0)
 
         self.setup_icons()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+import threading
+import collections
+import traceback
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuildPool(object):
+    ''' Worker threads shared by the build systems of all open documents.
+        At most max_workers tasks run at the same time, the others wait
+        in order. Callbacks are run on the main loop. '''
+
+    def __init__(self):
+        self.settings = ServiceLocator.get_settings()
+        self.settings.connect('settings_changed', self.on_settings_changed)
+
+        self.tasks = collections.deque()
+        self.condition = threading.Condition()
+        self.max_workers = max(1, self.settings.get_value('preferences', 'max_parallel_builds'))
+        self.number_of_workers = 0
+        self.number_of_idle_workers = 0
+
+    def on_settings_changed(self, settings, parameter):
+        section, item, value = parameter
+        if (section, item) == ('preferences', 'max_parallel_builds'):
+            self.set_max_workers(value)
+
+    def set_max_workers(self, max_workers):
+        with self.condition:
+            self.max_workers = max(1, max_workers)
+            self.condition.notify_all()
+            while self.number_of_workers < min(self.max_workers, len(self.tasks)):
+                self.start_worker()
+
+    def submit(self, function, arguments, callback):
+        ''' Run function(*arguments) in a worker, then callback(*arguments)
+            on the main loop. '''
+
+        with self.condition:
+            self.tasks.append((function, arguments, callback))
+            self.condition.notify()
+            if len(self.tasks) > self.number_of_idle_workers and self.number_of_workers < self.max_workers:
+                self.start_worker()
+
+    def run_together(self, tasks):
+        ''' Run (function, arguments) tasks at the same time from inside a
+            worker and return when all are done. They count against
+            max_workers, tasks no other worker has picked up are run by
+            the calling worker, so it never waits for a free worker. '''
+
+        group = {'running': len(tasks)}
+        pool_tasks = [(self.run_group_task, (group, function, arguments), None) for function, arguments in tasks[1:]]
+
+        with self.condition:
+            self.tasks.extendleft(reversed(pool_tasks))
+            self.condition.notify_all()
+            while len(self.tasks) > self.number_of_idle_workers and self.number_of_workers < self.max_workers:
+                self.start_worker()
+
+        self.run_group_task(group, *tasks[0])
+        for task in pool_tasks:
+            with self.condition:
+                index = next((index for index, queued_task in enumerate(self.tasks) if queued_task is task), None)
+                if index == None: continue
+                del(self.tasks[index])
+            task[0](*task[1])
+
+        with self.condition:
+            while group['running'] > 0:
+                self.condition.wait()
+
+    def run_group_task(self, group, function, arguments):
+        try:
+            function(*arguments)
+        except Exception:
+            traceback.print_exc()
+        with self.condition:
+            group['running'] -= 1
+            self.condition.notify_all()
+
+    def start_worker(self):
+        self.number_of_workers += 1
+        threading.Thread(target=self.run_worker, daemon=True).start()
+
+    def run_worker(self):
+        while True:
+            with self.condition:
+                while len(self.tasks) == 0 and self.number_of_workers <= self.max_workers:
+                    self.number_of_idle_workers += 1
+                    self.condition.wait()
+                    self.number_of_idle_workers -= 1
+                if self.number_of_workers > self.max_workers:
+                    self.number_of_workers -= 1
+                    self.condition.notify()
+                    return
+                function, arguments, callback = self.tasks.popleft()
+
+            try:
+                function(*arguments)
+            except Exception:
+                traceback.print_exc()
+            if callback != None:
+                GLib.idle_add(self.on_task_done, callback, arguments)
+
+    def on_task_done(self, callback, arguments):
+        callback(*arguments)
+        return False
+
+
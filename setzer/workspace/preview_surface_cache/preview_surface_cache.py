@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import collections
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class PreviewSurfaceCache(object):
+    ''' Keeps the memory used by rendered preview pages of all open
+        documents under preview_memory_budget (MB). When it's exceeded,
+        the pages used least recently are dropped first. With
+        preview_keep_low_resolution_copies, pages first lose their tiles
+        and keep only the low resolution preview, then the preview too.
+        Pages a renderer shows right now are never dropped.
+
+        entries: (renderer, page number) -> bytes, oldest first. '''
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.settings = ServiceLocator.get_settings()
+
+        self.entries = collections.OrderedDict()
+        self.memory_used = 0
+        self.budget = self.settings.get_value('preferences', 'preview_memory_budget') * 1048576
+        self.keep_low_resolution_copies = self.settings.get_value('preferences', 'preview_keep_low_resolution_copies')
+
+        self.workspace.connect('document_removed', self.on_document_removed)
+        self.settings.connect('settings_changed', self.on_settings_changed)
+
+    def on_document_removed(self, workspace, document):
+        if document.is_latex_document():
+            self.remove_renderer(document.preview.page_renderer)
+
+    def on_settings_changed(self, settings, parameter):
+        section, item, value = parameter
+        if (section, item) == ('preferences', 'preview_memory_budget'):
+            self.budget = value * 1048576
+            self.shrink()
+        if (section, item) == ('preferences', 'preview_keep_low_resolution_copies'):
+            self.keep_low_resolution_copies = value
+
+    def get_budget(self):
+        return self.budget
+
+    def get_memory_used(self):
+        ''' Bytes held by the surfaces of all renderers. '''
+
+        return self.memory_used
+
+    def set_page_memory(self, renderer, page_number, size):
+        ''' Called by renderers whenever the surfaces of a page change,
+            also marks the page as used. '''
+
+        self.memory_used -= self.entries.pop((renderer, page_number), 0)
+        if size > 0:
+            self.entries[(renderer, page_number)] = size
+            self.memory_used += size
+        self.shrink()
+
+    def touch(self, renderer, page_number):
+        if (renderer, page_number) in self.entries:
+            self.entries.move_to_end((renderer, page_number))
+
+    def remove_renderer(self, renderer):
+        for key in [key for key in self.entries if key[0] == renderer]:
+            self.memory_used -= self.entries.pop(key)
+
+    def shrink(self):
+        if self.memory_used <= self.budget: return
+
+        if self.keep_low_resolution_copies:
+            for renderer, page_number in list(self.entries):
+                if self.memory_used <= self.budget: return
+                if not renderer.is_page_visible(page_number):
+                    renderer.drop_page_tiles(page_number)
+
+        for renderer, page_number in list(self.entries):
+            if self.memory_used <= self.budget: return
+            if not renderer.is_page_visible(page_number):
+                renderer.drop_page(page_number)
+
+
@@ -64,7 +64,7 @@ class DocumentStats(object):
     def on_modified_changed(self, buffer):
         self.update_data()
 
-    #@timer
+    @timer
     def update_data(self):
         if self.document == None: return True
 
@@ -93,7 +93,7 @@ class DocumentStats(object):
         thread.start_new_thread(self.run_query, (['texcount', '-brief', filename], filename))
         return False
 
-    #@timer
+    @timer
     def run_query(self, arguments, filename):
         try:
             process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -108,7 +108,7 @@ class DocumentStats(object):
             self.values[filename]['counts'] = process.communicate()[0].decode('utf-8').split(' ')[0].split('+')
             self.texcount_missing = False
 
-    #@timer
+    @timer
     def update_view(self):
         with self.values_lock:
             if self.texcount_missing:
@@ -50,7 +50,7 @@ class DataProvider(Observable):
     def on_root_state_change(self, workspace, root_state):
         self.set_document()
 
-    def on_buffer_changed(self, content, parameter):
+    def on_symbols_updated(self, document):
         self.update_data()
 
     def on_is_root_changed(self, document, parameter):
@@ -64,11 +64,11 @@ class DataProvider(Observable):
         document = self.workspace.get_root_or_active_latex_document()
         if document != self.document:
             if self.document != None:
-                self.document.content.disconnect('buffer_changed', self.on_buffer_changed)
+                self.document.disconnect('symbols_updated', self.on_symbols_updated)
                 self.document.disconnect('is_root_changed', self.on_is_root_changed)
             self.document = document
             if self.document != None:
-                self.document.content.connect('buffer_changed', self.on_buffer_changed)
+                self.document.connect('symbols_updated', self.on_symbols_updated)
                 self.document.connect('is_root_changed', self.on_is_root_changed)
             self.update_data()
 
@@ -86,10 +86,10 @@ class DataProvider(Observable):
                 document = self.workspace.get_document_by_filename(filename)
                 if document:
                     integrated_includes[document] = (document, offset)
-                    document.content.connect('buffer_changed', self.on_buffer_changed)
+                    document.connect('symbols_updated', self.on_symbols_updated)
         for document in self.integrated_includes:
             if document not in integrated_includes:
-                document.content.disconnect('buffer_changed', self.on_buffer_changed)
+                document.disconnect('symbols_updated', self.on_symbols_updated)
         self.integrated_includes = integrated_includes
 
     def get_includes(self):
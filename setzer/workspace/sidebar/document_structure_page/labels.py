@@ -22,6 +22,7 @@ from gi.repository import Gdk
 
 import setzer.workspace.sidebar.document_structure_page.structure_widget as structure_widget
 import setzer.workspace.sidebar.document_structure_page.labels_viewgtk as labels_section_view
+from setzer.helpers.timer import timer
 
 
 class LabelsSection(structure_widget.StructureWidget):
@@ -48,7 +49,7 @@ class LabelsSection(structure_widget.StructureWidget):
             document.content.scroll_cursor_onscreen()
             self.data_provider.workspace.active_document.view.source_view.grab_focus()
 
-    #@timer
+    @timer
     def update_items(self, *params):
         labels = list()
         for label in self.data_provider.document.get_labels_with_offset():
@@ -25,6 +25,7 @@ import os.path
 
 import setzer.workspace.sidebar.document_structure_page.structure_widget as structure_widget
 import setzer.workspace.sidebar.document_structure_page.structure_viewgtk as structure_section_view
+from setzer.helpers.timer import timer
 
 
 class StructureSection(structure_widget.StructureWidget):
@@ -58,7 +59,7 @@ class StructureSection(structure_widget.StructureWidget):
             document.content.scroll_cursor_onscreen()
             self.data_provider.workspace.active_document.view.source_view.grab_focus()
 
-    #@timer
+    @timer
     def update_items(self, *params):
         sections = dict()
 
@@ -129,7 +130,7 @@ class StructureSection(structure_widget.StructureWidget):
         self.set_hover_item(None)
         self.view.queue_draw()
 
-    #@timer
+    @timer
     def draw(self, drawing_area, ctx):
         if len(self.nodes) == 0:
             return True
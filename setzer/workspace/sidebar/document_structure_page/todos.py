@@ -22,6 +22,7 @@ from gi.repository import Gdk
 
 import setzer.workspace.sidebar.document_structure_page.structure_widget as structure_widget
 import setzer.workspace.sidebar.document_structure_page.todos_viewgtk as todos_section_view
+from setzer.helpers.timer import timer
 
 
 class TodosSection(structure_widget.StructureWidget):
@@ -48,7 +49,7 @@ class TodosSection(structure_widget.StructureWidget):
             document.content.scroll_cursor_onscreen()
             self.data_provider.workspace.active_document.view.source_view.grab_focus()
 
-    #@timer
+    @timer
     def update_items(self, *params):
         todos = list()
         for todo in self.data_provider.document.get_todos_with_offset():#provide this function
@@ -76,7 +77,7 @@ class TodosSection(structure_widget.StructureWidget):
         self.set_hover_item(None)
         self.view.queue_draw()
 
-    #@timer
+    @timer
     def draw(self, drawing_area, ctx):
         if len(self.todos) == 0:
             return True
@@ -138,7 +138,7 @@ class WelcomeScreen(object):
         ctx.rotate(self.angle)
         self.draw_gradient(ctx)
 
-    #@timer
+    @timer
     def draw_gradient(self, ctx):
         overlay_width = max(self.view.header.get_allocated_width(), self.view.description.get_allocated_width())
 
@@ -152,7 +152,7 @@ class WelcomeScreen(object):
             ctx.rectangle(x, y, self.gradient_size, self.gradient_size)
             ctx.fill()
 
-    #@timer
+    @timer
     def update_gradient(self, widget=None, allocation=None):
         self.gradient_size = int(self.view.overlay.get_allocated_height() * 2.5)
         self.gradient_surface = cairo.ImageSurface(cairo.Format.ARGB32, self.gradient_size, self.gradient_size)
@@ -35,6 +35,9 @@ import setzer.workspace.welcome_screen.welcome_screen as welcome_screen
 import setzer.workspace.sidebar.sidebar as sidebar
 import setzer.workspace.shortcutsbar.shortcutsbar as shortcutsbar
 import setzer.workspace.build_log.build_log as build_log
+import setzer.workspace.build_pool.build_pool as build_pool
+import setzer.workspace.auto_build.auto_build as auto_build
+import setzer.workspace.preview_surface_cache.preview_surface_cache as preview_surface_cache
 import setzer.workspace.headerbar.headerbar_presenter as headerbar_presenter
 import setzer.workspace.document_chooser.document_chooser as document_chooser
 import setzer.workspace.keyboard_shortcuts.shortcuts as shortcuts
@@ -79,6 +82,9 @@ class Workspace(Observable):
         self.show_help = self.settings.get_value('window_state', 'show_help')
         self.show_preview = self.settings.get_value('window_state', 'show_preview')
         self.preview_position = self.settings.get_value('window_state', 'preview_paned_position')
+        self.build_pool = build_pool.BuildPool()
+        self.auto_build = auto_build.AutoBuild(self)
+        self.preview_surface_cache = preview_surface_cache.PreviewSurfaceCache(self)
         self.build_log = build_log.BuildLog(self)
         self.show_build_log = self.settings.get_value('window_state', 'show_build_log')
         self.build_log_position = self.settings.get_value('window_state', 'build_log_paned_position')
@@ -137,6 +143,7 @@ class Workspace(Observable):
         self.open_documents.remove(document)
         if document.is_latex_document():
             self.open_latex_documents.remove(document)
+            document.preview.page_renderer.shut_down()
         if self.active_document == document:
             candidate = self.get_last_active_document()
             if candidate == None: